@@ -1,24 +1,91 @@
-from fastapi import FastAPI, UploadFile, File
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi import Body
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from chatbot.cache import SemanticCache
 from chatbot.config import Settings
-from chatbot.memory import MemoryStore
+from chatbot.jobqueue import JobQueue
+from chatbot.memory import create_memory_store
 from chatbot.retrieval import Retriever
-from chatbot.llm import answer_with_context, vision_answer
+from chatbot.llm import answer_with_context_async, generate_answer, stream_answer, vision_answer_async
+import asyncio
+import json
 import os
+import threading
+import time
 
-app = FastAPI(title="Finance Policy RAG Chatbot")
+settings = Settings()
+memory = create_memory_store(settings)
+answer_cache = SemanticCache(
+    maxsize=settings.semantic_cache_size,
+    threshold=settings.semantic_cache_threshold,
+    ttl=settings.semantic_cache_ttl,
+    version_file=settings.index_version_file,
+)
+ingest_jobs = JobQueue(settings.ingest_jobs_path)
+
+async def run_memory(fn, *args, **kwargs):
+    """Call a session-memory method from an async handler, on a worker thread.
+
+    Both backends can block: SQLite's append_turn takes a write lock (BEGIN IMMEDIATE, 30 s
+    busy timeout) that uvicorn workers contend for, and the file store reads session files on
+    a cache miss and waits on a session lock held across its flock, write and fsync.
+    """
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+# The retriever loads the embedding model and connects to the vector index, so it is built on
+# first use (normally by the startup warmup) instead of at import time.
+_retriever: Optional[Retriever] = None
+_retriever_lock = threading.Lock()
+warmup_state: Dict[str, Any] = {"ready": False, "seconds": None, "error": None}
+
+def get_retriever() -> Retriever:
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = Retriever(settings=settings)
+    return _retriever
+
+def ready_retriever() -> Retriever:
+    """The retriever for async handlers: 503 until warmup has built it, so a request never waits
+    on the build lock (or retries a failing build) on the event loop."""
+    if not warmup_state["ready"]:
+        raise HTTPException(status_code=503, detail="Warming up, retry shortly", headers={"Retry-After": "5"})
+    return get_retriever()
+
+def warmup(stop: threading.Event, retry_interval: float = 5.0):
+    """Build and warm the retriever, retrying until it succeeds so /ready only flips once it's usable."""
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            get_retriever().warmup()
+        except Exception as e:
+            warmup_state["error"] = str(e)
+            print(f"Warmup failed, retrying in {retry_interval}s: {e}")
+            stop.wait(retry_interval)
+            continue
+        warmup_state.update(ready=True, seconds=round(time.perf_counter() - start, 3), error=None)
+        print(f"Warmup finished in {warmup_state['seconds']}s")
+        return
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server binds immediately and /ready can report progress.
+    stop = threading.Event()
+    threading.Thread(target=warmup, args=(stop,), name="warmup", daemon=True).start()
+    yield
+    stop.set()
+
+app = FastAPI(title="Finance Policy RAG Chatbot", lifespan=lifespan)
 
 if os.path.exists("static"):
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
-settings = Settings()
-memory = MemoryStore(base_dir="sessions", max_turns=6)
-retriever = Retriever(settings=settings)
-
 class ChatRequest(BaseModel):
     question: str
     session_id: str
@@ -27,6 +94,18 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[Dict[str, Any]]
 
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+
+class BatchChatItem(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    sources: List[Dict[str, Any]] = []
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatItem]
+
 class PageRequest(BaseModel):
     book_id: str
     page_number: int
@@ -45,18 +124,7 @@ class VisionChatRequest(BaseModel):
     session_id: str
     base64_image: str  
 
-@app.get("/")
-def read_root():
-    """Serve the main HTML interface"""
-    return FileResponse('static/index.html')
-
-@app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    history = memory.get_history(req.session_id)
-    summary = memory.get_summary(req.session_id)
-
-    relevant_docs = retriever.retrieve_relevant_docs(req.question, top_k=5)
-    
+def _build_contexts(relevant_docs) -> List[Dict[str, Any]]:
     contexts = []
     for similarity, book_id, chunk_id, text_content, page_number in relevant_docs:
         contexts.append({
@@ -67,18 +135,10 @@ def chat(req: ChatRequest):
             "page_number": page_number,
             "page": page_number 
         })
+    return contexts
 
-    answer = answer_with_context(
-        question=req.question,
-        contexts=contexts,
-        chat_history=history,
-        summary=summary
-    )
-    print(f"Generated answer: {answer}")
-
-    memory.append_turn(req.session_id, user=req.question, assistant=answer)
-
-    sources = [
+def _build_sources(contexts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
         {
             "book_id": c.get("book_id"), 
             "chunk_id": c.get("chunk_id"),
@@ -90,7 +150,154 @@ def chat(req: ChatRequest):
         for c in contexts
     ]
 
+def _cacheable(contexts: List[Dict[str, Any]], history: List[Dict[str, str]], summary: str) -> bool:
+    # Follow-ups take their meaning from the session ("what about debt?"), so only answers to
+    # questions asked without any conversation are shared through the cache.
+    return bool(contexts) and not history and not summary
+
+def _cached_answer(query_embedding: Optional[List[float]], contexts: List[Dict[str, Any]], history: List[Dict[str, str]], summary: str) -> Optional[Dict[str, Any]]:
+    # No embedding: the answer came from the table registry, which is cheap to answer from anyway.
+    if query_embedding is None or not _cacheable(contexts, history, summary):
+        return None
+    return answer_cache.lookup(query_embedding, [c["chunk_id"] for c in contexts])
+
+def _cache_answer(query_embedding: Optional[List[float]], contexts: List[Dict[str, Any]], history: List[Dict[str, str]], summary: str, answer: str, sources: List[Dict[str, Any]]):
+    # Never cache failures, answers produced without any retrieved context, or session-dependent ones.
+    if query_embedding is None or not _cacheable(contexts, history, summary) or not answer or answer.startswith("Error"):
+        return
+    answer_cache.store(query_embedding, [c["chunk_id"] for c in contexts], answer, sources)
+
+@app.get("/")
+def read_root():
+    """Serve the main HTML interface"""
+    return FileResponse('static/index.html')
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    retriever = ready_retriever()
+    history, summary = await run_memory(memory.get_session, req.session_id)
+
+    relevant_docs, query_embedding = await retriever.aretrieve_with_embedding(req.question, top_k=5)
+    
+    contexts = _build_contexts(relevant_docs)
+
+    cached = _cached_answer(query_embedding, contexts, history, summary)
+    if cached is not None:
+        await run_memory(memory.append_turn, req.session_id, user=req.question, assistant=cached["answer"])
+        return ChatResponse(answer=cached["answer"], sources=cached["sources"])
+
+    answer = await answer_with_context_async(
+        question=req.question,
+        contexts=contexts,
+        chat_history=history,
+        summary=summary
+    )
+    print(f"Generated answer: {answer}")
+
+    await run_memory(memory.append_turn, req.session_id, user=req.question, assistant=answer)
+
+    sources = _build_sources(contexts)
+    _cache_answer(query_embedding, contexts, history, summary, answer, sources)
     return ChatResponse(answer=answer, sources=sources)
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# this api streams the answer as server-sent events
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Same as /chat, but streams the response as server-sent events:
+    a `sources` event first, then one `token` event per generated piece of text,
+    then `done` with the full answer (or `error`). The turn is saved to memory
+    once the stream completes.
+    """
+    retriever = ready_retriever()
+    history, summary = await run_memory(memory.get_session, req.session_id)
+
+    relevant_docs, query_embedding = await retriever.aretrieve_with_embedding(req.question, top_k=5)
+    
+    contexts = _build_contexts(relevant_docs)
+    cached = _cached_answer(query_embedding, contexts, history, summary)
+
+    async def events():
+        if cached is not None:
+            yield _sse("sources", {"sources": cached["sources"]})
+            yield _sse("token", {"text": cached["answer"]})
+            await run_memory(memory.append_turn, req.session_id, user=req.question, assistant=cached["answer"])
+            yield _sse("done", {"answer": cached["answer"]})
+            return
+
+        sources = _build_sources(contexts)
+        yield _sse("sources", {"sources": sources})
+
+        parts = []
+        try:
+            async for token in stream_answer(
+                question=req.question,
+                contexts=contexts,
+                chat_history=history,
+                summary=summary
+            ):
+                parts.append(token)
+                yield _sse("token", {"text": token})
+        except Exception as e:
+            yield _sse("error", {"detail": f"Error generating response: {e}"})
+            return
+
+        answer = "".join(parts).strip()
+        await run_memory(memory.append_turn, req.session_id, user=req.question, assistant=answer)
+        _cache_answer(query_embedding, contexts, history, summary, answer, sources)
+        yield _sse("done", {"answer": answer})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# this api is for questionnaires: many independent questions answered in one call
+@app.post("/chat/batch", response_model=BatchChatResponse)
+def chat_batch(req: BatchChatRequest):
+    """
+    Answer a list of independent questions (no session memory).
+    Questions are embedded in one batched encode, vector queries run concurrently
+    and LLM calls fan out with bounded concurrency. Results keep the input order;
+    a failing question gets an `error` instead of failing the whole batch.
+    """
+    if len(req.questions) > settings.batch_max_questions:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.batch_max_questions} questions per batch"
+        )
+
+    retriever = get_retriever()
+    retrieved = retriever.retrieve_batch_with_embeddings(
+        req.questions, top_k=5, max_workers=settings.batch_query_workers
+    )
+
+    def answer_one(question: str, retrieval) -> BatchChatItem:
+        relevant_docs, query_embedding = retrieval
+        if isinstance(relevant_docs, Exception):
+            return BatchChatItem(question=question, error=f"Retrieval failed: {relevant_docs}")
+        contexts = _build_contexts(relevant_docs)
+        cached = _cached_answer(query_embedding, contexts, [], "")
+        if cached is not None:
+            return BatchChatItem(question=question, answer=cached["answer"], sources=cached["sources"])
+
+        sources = _build_sources(contexts)
+        try:
+            answer = generate_answer(question=question, contexts=contexts, chat_history=[], summary="")
+        except Exception as e:
+            return BatchChatItem(question=question, sources=sources, error=f"Error generating response: {e}")
+        _cache_answer(query_embedding, contexts, [], "", answer, sources)
+        return BatchChatItem(question=question, answer=answer, sources=sources)
+
+    with ThreadPoolExecutor(max_workers=max(1, settings.batch_llm_concurrency)) as pool:
+        results = list(pool.map(answer_one, req.questions, retrieved))
+
+    return BatchChatResponse(results=results)
+
 # this api is for page-based extraction
 @app.post("/page", response_model=PageResponse)
 def get_page(req: PageRequest):
@@ -98,7 +305,7 @@ def get_page(req: PageRequest):
     Extract all text chunks from a specific book and page number.
     This is the page-based extraction functionality.
     """
-    chunks = retriever.query_page(req.book_id, req.page_number)
+    chunks = get_retriever().query_page(req.book_id, req.page_number)
     
     return PageResponse(
         book_id=req.book_id,
@@ -107,22 +314,23 @@ def get_page(req: PageRequest):
     )
 
 @app.post("/vision")
-def vision(req: VisionRequest):
-    result = vision_answer(prompt=req.prompt, base64_image=req.base64_image)
+async def vision(req: VisionRequest):
+    result = await vision_answer_async(prompt=req.prompt, base64_image=req.base64_image)
     return {"answer": result}
 
 # this api is for vision-based chat
 @app.post("/vision-chat", response_model=ChatResponse)
-def vision_chat(req: VisionChatRequest):
+async def vision_chat(req: VisionChatRequest):
     """
     Process an image with vision model first, then use the extracted text 
     along with the question to search documents and provide contextual answers
     """
+    retriever = ready_retriever()
     vision_prompt = f"""Analyze this image and provide the image text only
     
     User's question context: {req.question}"""
     
-    image_description = vision_answer(prompt=vision_prompt, base64_image=req.base64_image)
+    image_description = await vision_answer_async(prompt=vision_prompt, base64_image=req.base64_image)
     
     enhanced_question = f"""
     User Question: {req.question}
@@ -131,41 +339,39 @@ def vision_chat(req: VisionChatRequest):
     
     """
     
-    history = memory.get_history(req.session_id)
-    summary = memory.get_summary(req.session_id)
+    history, summary = await run_memory(memory.get_session, req.session_id)
 
-    relevant_docs = retriever.retrieve_relevant_docs(enhanced_question, top_k=5)
+    relevant_docs = await retriever.aretrieve_relevant_docs(enhanced_question, top_k=5)
     
-    contexts = []
-    for similarity, book_id, chunk_id, text_content, page_number in relevant_docs:
-        contexts.append({
-            "text": text_content,
-            "book_id": book_id,
-            "chunk_id": chunk_id,
-            "similarity": similarity,
-            "page_number": page_number,
-            "page": page_number 
-        })
+    contexts = _build_contexts(relevant_docs)
 
-    answer = answer_with_context(
+    answer = await answer_with_context_async(
         question=enhanced_question,
         contexts=contexts,
         chat_history=history,
         summary=summary
     )
 
-    memory.append_turn(req.session_id, user=f"[Image + Question] {req.question}", assistant=answer)
+    await run_memory(memory.append_turn, req.session_id, user=f"[Image + Question] {req.question}", assistant=answer)
 
-    sources = [
-        {
-            "book_id": c.get("book_id"), 
-            "chunk_id": c.get("chunk_id"),
-            "similarity": c.get("similarity"),
-            "page_number": c.get("page_number"),
-            "page": c.get("page_number"),  
-            "snippet": c.get("text", "")[:300]
-        }
-        for c in contexts
-    ]
+    return ChatResponse(answer=answer, sources=_build_sources(contexts))
 
-    return ChatResponse(answer=answer, sources=sources)
+@app.get("/cache-stats")
+def cache_stats():
+    """Hit/miss counters of the in-process caches (and rerank stage cost, when enabled)."""
+    return {
+        "embedding": _retriever.embedding_cache.stats() if _retriever is not None else None,
+        "rerank": _retriever.reranker.stats() if _retriever is not None and _retriever.reranker is not None else None,
+        "answer": answer_cache.stats(),
+    }
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the startup warmup has loaded the model and reached the index."""
+    status_code = 200 if warmup_state["ready"] else 503
+    return JSONResponse(status_code=status_code, content=warmup_state)
+
+@app.get("/ingest/status")
+def ingest_status(limit: int = 20):
+    """Job counts by state and the most recent jobs of the ingest daemon."""
+    return {"counts": ingest_jobs.stats(), "recent": ingest_jobs.recent(limit)}
@@ -0,0 +1,125 @@
+"""
+Benchmark PDF extraction throughput (pages/s): the previous pandas-based extractor that runs
+table detection on every page vs. the current one with the table-free fast path.
+Table registration (find_page_tables) is turned off on the current side so both do the same
+work, and each side reports its best of --repeat runs. Also checks that both produce identical
+page text and counts the pages the fast path skips (pages with fewer than two horizontal and two
+vertical ``line`` objects; tables drawn with rects don't count).
+
+Usage: python bench_extraction.py [--repeat N] [pdf ...]   (defaults to data/*.pdf)
+"""
+
+import argparse
+import glob
+import time
+import pandas as pd
+import pdfplumber
+from pdfplumber.utils import extract_text, get_bbox_overlap, obj_to_bbox
+from chatbot.extraction import TABLE_SETTINGS, extract_page, may_contain_table
+
+def extract_page_before(page):
+    """The extractor as it was before the fast path, kept here as the baseline."""
+    page_number = page.page_number
+    filtered_page = page
+    chars = filtered_page.chars
+
+    try:
+        for table in page.find_tables(table_settings=TABLE_SETTINGS):
+            try:
+                first_table_char = page.crop(table.bbox).chars[0]
+            except IndexError:
+                first_table_char = {"x0": table.bbox[0], "y0": table.bbox[1], "text": ""}
+
+            filtered_page = filtered_page.filter(
+                lambda obj: get_bbox_overlap(obj_to_bbox(obj), table.bbox) is None
+            )
+            chars = filtered_page.chars
+            df = pd.DataFrame(table.extract())
+            if df.empty:
+                continue
+
+            headers = list(df.iloc[0])
+            df = df.drop(0).reset_index(drop=True) if len(df) > 1 else df
+
+            table_text = []
+            for col_idx, header in enumerate(headers):
+                if header is None or str(header).strip() == "":
+                    continue
+                col_values = df[col_idx].dropna().tolist()
+                section = f"{header.strip()}:\n" + "\n".join(
+                    f"- {str(val).strip()}" for val in col_values if str(val).strip()
+                )
+                table_text.append(section)
+
+            formatted_table = "\n\n".join(table_text)
+            chars.append(first_table_char | {"text": formatted_table})
+
+        return {'page_number': page_number, 'content': extract_text(chars, layout=True)}
+
+    except Exception as e:
+        print(f"Error processing page {page_number}: {str(e)}")
+        return {'page_number': page_number, 'content': page.extract_text() or ""}
+
+def extract_page_after(page):
+    """The current extractor without table registration, which the baseline doesn't do."""
+    return extract_page(page, register_tables=False)
+
+def run(pdf_path, extractor, repeat=1):
+    """Extracted pages and the best wall time of ``repeat`` runs."""
+    best = None
+    for _ in range(repeat):
+        # A fresh handle per run so neither side benefits from pdfplumber's per-page caches.
+        start = time.perf_counter()
+        with pdfplumber.open(pdf_path) as pdf:
+            pages = []
+            for page in pdf.pages:
+                pages.append(extractor(page))
+                page.close()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return pages, best
+
+def count_skipped(pdf_path):
+    """Pages on which the fast path skips find_tables."""
+    with pdfplumber.open(pdf_path) as pdf:
+        return sum(not may_contain_table(page) for page in pdf.pages)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF extraction throughput")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per extractor; the best is reported")
+    parser.add_argument("paths", nargs="*", help="PDFs to extract (default: data/*.pdf)")
+    args = parser.parse_args()
+    paths = args.paths or sorted(glob.glob("data/*.pdf"))
+    if not paths:
+        print("No PDFs found; pass paths or put files in data/")
+        return
+
+    total_pages = 0
+    total_before = total_after = 0.0
+    for path in paths:
+        before, before_s = run(path, extract_page_before, args.repeat)
+        after, after_s = run(path, extract_page_after, args.repeat)
+        after = [{'page_number': p['page_number'], 'content': p['content']} for p in after]
+        skipped = count_skipped(path)
+        same = before == after
+        total_pages += len(before)
+        total_before += before_s
+        total_after += after_s
+        print(
+            f"{path}: {len(before)} pages | before {len(before) / before_s:.1f} pages/s"
+            f" | after {len(after) / after_s:.1f} pages/s | table detection skipped on"
+            f" {skipped}/{len(before)} pages | identical output: {same}"
+        )
+        if not same:
+            for b, a in zip(before, after):
+                if b != a:
+                    print(f"  page {b['page_number']} differs")
+
+    if total_pages:
+        print("-" * 50)
+        print(f"Total {total_pages} pages: before {total_pages / total_before:.1f} pages/s, "
+              f"after {total_pages / total_after:.1f} pages/s "
+              f"({total_before / total_after:.2f}x)")
+
+if __name__ == "__main__":
+    main()
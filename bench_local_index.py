@@ -0,0 +1,111 @@
+"""
+Benchmark the local vector index storage dtypes (float32 / float16 / int8) on synthetic
+clustered embeddings: recall@k against exact float32 search, vector memory and query latency.
+Also compares metadata memory of one dict per chunk with the columnar layout.
+
+Usage: python bench_local_index.py [--sizes 100000 1000000] [--queries 200] [--top-k 10]
+"""
+
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from chatbot.config import Settings
+from chatbot.vectorstore import LocalVectorStore, MetadataColumns
+
+DIM = 384
+BLOCK = 50_000
+
+def make_metadata(i):
+    return {
+        'text': f"chunk {i}",
+        'book_id': f"book-{i // 5000}.pdf",
+        'page_number': (i // 5) % 300 + 1,
+        'chunk_order': i % 5,
+        'llm_formatted': True
+    }
+
+def embedding_blocks(n, seed=0, clusters=2000):
+    """Embeddings drawn around topic centres, so neighbours are close as with real chunks."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, DIM)).astype(np.float32)
+    for start in range(0, n, BLOCK):
+        size = min(BLOCK, n - start)
+        rows = centres[rng.integers(0, clusters, size)] + 0.6 * rng.normal(size=(size, DIM)).astype(np.float32)
+        yield start, rows
+
+def make_queries(count, seed=1):
+    rng = np.random.default_rng(seed)
+    _, rows = next(embedding_blocks(count, seed=0))
+    return rows[:count] + 0.3 * rng.normal(size=(count, DIM)).astype(np.float32)
+
+def build_store(n, dtype, index_dir):
+    store = LocalVectorStore(Settings(local_index_dir=index_dir, local_index_dtype=dtype))
+    for start, rows in embedding_blocks(n):
+        store._add([(f"vec-{start + j}", row, make_metadata(start + j)) for j, row in enumerate(rows)])
+    return store
+
+def run_queries(store, queries, top_k):
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        results.append([match["_id"] for match in store.query(q, top_k=top_k)])
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+def metadata_memory(n):
+    """Traced bytes of n metadata records: list of dicts vs. MetadataColumns (texts included in both)."""
+    tracemalloc.start()
+    as_dicts = [make_metadata(i) for i in range(n)]
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    del as_dicts
+    gc.collect()
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    columns = MetadataColumns()
+    for i in range(n):
+        columns.set(i, make_metadata(i))
+    column_bytes = tracemalloc.get_traced_memory()[0]
+    del columns
+    gc.collect()
+    tracemalloc.stop()
+    return dict_bytes, column_bytes
+
+def main():
+    parser = argparse.ArgumentParser(description="Local index dtype benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries)
+    for n in args.sizes:
+        print(f"=== {n:,} chunks, {args.queries} queries, recall@{args.top_k} vs exact float32 ===")
+        with tempfile.TemporaryDirectory() as index_dir:
+            exact = None
+            for dtype in ("float32", "float16", "int8"):
+                start = time.perf_counter()
+                store = build_store(n, dtype, index_dir)
+                build_s = time.perf_counter() - start
+                results, latency_ms = run_queries(store, queries, args.top_k)
+                if exact is None:
+                    exact = results
+                recall = np.mean([len(set(r) & set(e)) / len(e) for r, e in zip(results, exact)])
+                vector_mb = store.nbytes() * len(store) / store._vectors.shape[0] / 1e6
+                print(
+                    f"{dtype:>8}: vectors {vector_mb:8.1f} MB | recall {recall:.4f}"
+                    f" | query {latency_ms:7.2f} ms | build {build_s:5.1f}s"
+                )
+                del store
+                gc.collect()
+
+        dict_bytes, column_bytes = metadata_memory(n)
+        print(
+            f"metadata: dict per chunk {dict_bytes / 1e6:.1f} MB | columnar {column_bytes / 1e6:.1f} MB"
+            f" ({dict_bytes / column_bytes:.1f}x smaller)"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark the cross-encoder rerank stage: recall@k, latency and CPU time per query
+with and without reranking, over the ingested documents.
+
+Queries come from a JSONL file of {"query", "book_id", "page_number"} lines (--queries), or
+are sampled from the page store as known-item queries: a run of words taken from a chunk,
+labelled with that chunk's page.
+
+Usage: python bench_rerank.py [--queries FILE] [--count 100] [--top-k 5] [--candidates 20] [--budget-ms 150]
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import time
+from chatbot.config import Settings
+from chatbot.retrieval import Retriever
+
+def known_item_queries(page_store_path, count, words=10, seed=0):
+    conn = sqlite3.connect(page_store_path)
+    try:
+        rows = conn.execute("SELECT book_id, page_number, text FROM chunks").fetchall()
+    finally:
+        conn.close()
+    rng = random.Random(seed)
+    queries = []
+    for book_id, page_number, text in rng.sample(rows, min(count, len(rows))):
+        tokens = text.split()
+        if len(tokens) < words:
+            continue
+        start = rng.randrange(len(tokens) - words + 1)
+        queries.append({"query": " ".join(tokens[start:start + words]), "book_id": book_id, "page_number": page_number})
+    return queries
+
+def load_queries(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def evaluate(retriever, queries, top_k):
+    retriever.embedding_cache.clear()
+    hits = 0
+    wall = cpu = 0.0
+    for q in queries:
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        results = retriever.retrieve_relevant_docs(q["query"], top_k=top_k)
+        wall += time.perf_counter() - wall_start
+        cpu += time.process_time() - cpu_start
+        if any(book_id == q["book_id"] and page_number == q["page_number"]
+               for _, book_id, _, _, page_number in results):
+            hits += 1
+    n = len(queries)
+    return hits / n, wall * 1000 / n, cpu * 1000 / n
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerank recall/cost benchmark")
+    parser.add_argument("--queries", help="JSONL file of {query, book_id, page_number}")
+    parser.add_argument("--count", type=int, default=100, help="Known-item queries to sample")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    settings = Settings().model_copy(update={
+        "rerank_candidates": args.candidates,
+        "rerank_budget_ms": args.budget_ms,
+    })
+    queries = load_queries(args.queries) if args.queries else known_item_queries(settings.page_store_path, args.count)
+    if not queries:
+        print("No queries; ingest documents first or pass --queries")
+        return
+
+    retriever = Retriever(settings)
+    retriever.warmup()
+    reranker = retriever.reranker
+
+    retriever.reranker = None
+    recall, wall_ms, cpu_ms = evaluate(retriever, queries, args.top_k)
+    print(f"{len(queries)} queries, recall@{args.top_k} = query's page among the results")
+    print(f"without rerank: recall {recall:.3f} | {wall_ms:7.1f} ms/query | cpu {cpu_ms:7.1f} ms/query")
+
+    retriever.reranker = reranker
+    recall, wall_ms, cpu_ms = evaluate(retriever, queries, args.top_k)
+    print(f"with rerank:    recall {recall:.3f} | {wall_ms:7.1f} ms/query | cpu {cpu_ms:7.1f} ms/query")
+    stats = reranker.stats()
+    print(
+        f"rerank stage: {stats['pairs_scored'] / max(1, stats['calls']):.1f} pairs/query,"
+        f" {stats['ms_per_pair']} ms/pair, {stats['truncated']} truncated and {stats['skipped']} skipped"
+        f" by the {args.budget_ms:.0f} ms budget"
+    )
+
+if __name__ == "__main__":
+    main()
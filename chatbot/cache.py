@@ -0,0 +1,191 @@
+"""
+This module provides small in-process caches shared by the chatbot components.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache with an optional per-entry TTL.
+
+    - Evicts the least recently used entry once ``maxsize`` is reached
+    - Entries older than ``ttl`` seconds are treated as misses (``ttl=0`` disables expiry)
+    - Keeps hit/miss counters, exposed via ``stats()``
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if not self.ttl or time.monotonic() - stored_at < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def bump_index_version(path: str):
+    """Record that the vector index changed; SemanticCache instances watching ``path`` drop their entries."""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(str(time.time_ns()))
+
+
+class SemanticCache:
+    """Answer cache keyed by question-embedding similarity.
+
+    - A lookup hits when a cached question retrieved the same chunk IDs and its
+      embedding is within ``threshold`` cosine similarity of the new question
+    - LRU eviction beyond ``maxsize`` entries, optional TTL
+    - Cleared whenever ``version_file`` changes (written by ingest via ``bump_index_version``)
+    """
+    def __init__(self, maxsize: int = 512, threshold: float = 0.95, ttl: float = 0, version_file: Optional[str] = None):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.version_file = version_file
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._by_chunks: Dict[Tuple[str, ...], set] = {}
+        self._next_id = 0
+        self._version = self._read_version()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _read_version(self) -> Optional[int]:
+        if not self.version_file:
+            return None
+        try:
+            return os.stat(self.version_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_version(self):
+        version = self._read_version()
+        if version != self._version:
+            self._version = version
+            self._clear()
+            self.invalidations += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self._by_chunks.clear()
+
+    def _remove(self, entry_id: int):
+        chunk_key = self._entries.pop(entry_id)[0]
+        ids = self._by_chunks.get(chunk_key)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_chunks[chunk_key]
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, embedding: List[float], chunk_ids: List[str]) -> Optional[Dict[str, Any]]:
+        """Return ``{"answer", "sources", "similarity"}`` for the closest matching cached question, or None."""
+        chunk_key = tuple(chunk_ids)
+        query = self._unit(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version()
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_chunks.get(chunk_key, ())):
+                _, vec, _, _, stored_at = self._entries[entry_id]
+                if self.ttl and now - stored_at >= self.ttl:
+                    self._remove(entry_id)
+                    continue
+                score = float(vec @ query)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            _, _, answer, sources, _ = self._entries[best_id]
+            return {"answer": answer, "sources": sources, "similarity": best_score}
+
+    def store(self, embedding: List[float], chunk_ids: List[str], answer: str, sources: List[Dict[str, Any]]):
+        if self.maxsize <= 0:
+            return
+        chunk_key = tuple(chunk_ids)
+        with self._lock:
+            self._check_version()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (chunk_key, self._unit(embedding), answer, sources, time.monotonic())
+            self._by_chunks.setdefault(chunk_key, set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+            self.invalidations += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
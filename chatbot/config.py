@@ -12,3 +12,56 @@ class Settings(BaseModel):
     groq_api_key: str = os.getenv("GROQ_API_KEY", "")
     embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
     embedding_dim: int = 384
+    # "torch" (sentence-transformers), "onnx" or "onnx-int8" (ONNX Runtime, files under onnx_model_dir)
+    embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "torch")
+    onnx_model_dir: str = os.getenv("ONNX_MODEL_DIR", "models/all-MiniLM-L6-v2-onnx")
+    # ONNX Runtime intra-op threads (0 = runtime default)
+    onnx_threads: int = int(os.getenv("ONNX_THREADS", "0"))
+    # "pinecone" or "local" (in-process NumPy index persisted under local_index_dir)
+    vector_backend: str = os.getenv("VECTOR_BACKEND", "pinecone")
+    local_index_dir: str = os.getenv("LOCAL_INDEX_DIR", "index")
+    # Storage of local index vectors: "float32", "float16" (half the memory) or "int8"
+    # (scalar-quantized with a per-vector scale, a quarter of the memory); see bench_local_index.py
+    local_index_dtype: str = os.getenv("LOCAL_INDEX_DTYPE", "float32")
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+    embedding_cache_ttl: float = float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))
+    batch_max_questions: int = int(os.getenv("BATCH_MAX_QUESTIONS", "200"))
+    batch_query_workers: int = int(os.getenv("BATCH_QUERY_WORKERS", "8"))
+    batch_llm_concurrency: int = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+    # Dedicated threads for CPU-bound query embedding on the async request path
+    embedding_workers: int = int(os.getenv("EMBEDDING_WORKERS", "2"))
+    # Semantic answer cache: reuse an answer when a near-identical question retrieved the same chunks
+    semantic_cache_size: int = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+    semantic_cache_threshold: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    semantic_cache_ttl: float = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+    # Touched by ingest after every upsert so caches can drop stale answers
+    index_version_file: str = os.getenv("INDEX_VERSION_FILE", ".index_version")
+    # SQLite sidecar of chunk text keyed by (book_id, page_number, chunk_order), written by ingest
+    page_store_path: str = os.getenv("PAGE_STORE_PATH", "store/pages.db")
+    # BM25 keyword index written by ingest; its hits are fused with the vector results (RRF)
+    keyword_index_path: str = os.getenv("KEYWORD_INDEX_PATH", "store/keywords.db")
+    # Tables detected at ingest, keyed by ID ("1.2.1"); questions naming a table are answered from it
+    table_registry_path: str = os.getenv("TABLE_REGISTRY_PATH", "store/tables.db")
+    # Keyword candidates per query (0 = dense retrieval only) and the RRF rank constant
+    keyword_top_k: int = int(os.getenv("KEYWORD_TOP_K", "10"))
+    rrf_k: int = int(os.getenv("RRF_K", "60"))
+    # Tokens of neighbouring chunks (adjacency map in the page store) added around each result (0 = off)
+    neighbour_token_budget: int = int(os.getenv("NEIGHBOUR_TOKEN_BUDGET", "256"))
+    # Cross-encoder rerank of the first RERANK_CANDIDATES results (0 = off) within a per-request budget
+    rerank_model_name: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    rerank_candidates: int = int(os.getenv("RERANK_CANDIDATES", "0"))
+    rerank_budget_ms: float = float(os.getenv("RERANK_BUDGET_MS", "150"))
+    rerank_cache_size: int = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+    # Seconds between write-backs of session memory (0 = write every turn synchronously)
+    session_flush_interval: float = float(os.getenv("SESSION_FLUSH_INTERVAL", "1.0"))
+    # "file" (one JSON file per session under sessions/) or "sqlite"
+    memory_backend: str = os.getenv("MEMORY_BACKEND", "file")
+    sessions_db_path: str = os.getenv("SESSIONS_DB_PATH", "store/sessions.db")
+    # Concurrent upsert requests, batches queued or in flight per file, per-request byte budget
+    # (Pinecone limit is 4 MB) and retries per batch
+    upsert_workers: int = int(os.getenv("UPSERT_WORKERS", "4"))
+    upsert_max_in_flight: int = int(os.getenv("UPSERT_MAX_IN_FLIGHT", "8"))
+    upsert_max_batch_bytes: int = int(os.getenv("UPSERT_MAX_BATCH_BYTES", str(3_800_000)))
+    upsert_max_retries: int = int(os.getenv("UPSERT_MAX_RETRIES", "5"))
+    # Persistent job queue of the ingest daemon (ingest.py --daemon), also read by /ingest/status
+    ingest_jobs_path: str = os.getenv("INGEST_JOBS_PATH", "store/ingest_jobs.db")
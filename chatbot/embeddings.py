@@ -0,0 +1,127 @@
+"""
+Sentence embedding backends.
+
+- "torch": sentence-transformers (default)
+- "onnx": the same model exported to ONNX and run with ONNX Runtime (no torch at serving time)
+- "onnx-int8": the ONNX export with int8 dynamic-quantized weights
+
+The ONNX files are produced once with export_onnx_model (needs torch + transformers);
+serving only needs onnxruntime, tokenizers and numpy.
+"""
+
+import os
+from typing import List
+import numpy as np
+from chatbot.config import Settings
+
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+class OnnxEmbedder:
+    """
+    Drop-in for the parts of SentenceTransformer the repo uses (encode, get_sentence_embedding_dimension):
+    - BERT forward pass in ONNX Runtime
+    - mean pooling over the attention mask, then L2 normalisation (as all-MiniLM-L6-v2's pipeline does)
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = False, max_seq_length: int = 256,
+                 batch_size: int = 32, threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found; create it with chatbot.embeddings.export_onnx_model"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        self.batch_size = batch_size
+        self.dim = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts (same output layout as SentenceTransformer.encode for a list input)."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        # Batch texts of similar length together to keep padding small, then restore input order.
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            embeddings[idx] = self._encode_batch([texts[i] for i in idx])
+        return embeddings
+
+def export_onnx_model(model_name: str, model_dir: str, quantize: bool = True, opset: int = 17):
+    """Export the transformer of a sentence-transformers model to ONNX (plus an int8 copy)."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+    tokenizer.save_pretrained(model_dir)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            os.path.join(model_dir, ONNX_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            os.path.join(model_dir, ONNX_FILE),
+            os.path.join(model_dir, ONNX_INT8_FILE),
+            weight_type=QuantType.QInt8,
+        )
+    print(f"Exported {model_name} to {model_dir}")
+
+def create_embedder(settings: Settings):
+    """Return the embedding model selected by ``settings.embedding_backend``."""
+    if settings.embedding_backend in ("onnx", "onnx-int8"):
+        return OnnxEmbedder(
+            settings.onnx_model_dir,
+            quantized=settings.embedding_backend == "onnx-int8",
+            threads=settings.onnx_threads,
+        )
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(settings.embedding_model_name)
@@ -0,0 +1,266 @@
+"""
+PDF page extraction with table formatting, shared by ingest.py.
+
+Kept free of model/index side effects so process-pool workers can import it cheaply.
+"""
+
+import multiprocessing
+import os
+import re
+import textwrap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import pdfplumber
+from pdfplumber.utils import extract_text, get_bbox_overlap, obj_to_bbox
+
+TABLE_SETTINGS = {
+    "vertical_strategy": "lines_strict",
+    "horizontal_strategy": "lines_strict",
+    "snap_tolerance": 3,
+    "join_tolerance": 3,
+    "min_words_vertical": 1,
+    "min_words_horizontal": 1
+}
+
+# A caption line starts with "Table" and a dotted number, e.g. "Table 1.2.1".
+_CAPTION_RE = re.compile(r"^\s*Table\s+\d+(?:\.\d+)+", re.IGNORECASE | re.MULTILINE)
+_TABLE_ID_RE = re.compile(r"^\d+(?:\.\d+)+$")
+# Gap between text lines, in median line pitches, that ends an unruled table block.
+_BLOCK_GAP = 2.5
+# Pages per process-pool shard; with two shards per worker outstanding this caps how far
+# extraction runs ahead of the consumer, whatever the document length.
+SHARD_PAGES = 8
+
+def may_contain_table(page) -> bool:
+    """Cheap necessary condition for find_tables with the lines_strict strategy.
+
+    lines_strict only builds cells from ``line`` objects (rects and curves are ignored), and a
+    cell needs two vertical and two horizontal edges, so pages with fewer lines can't hold a table.
+    """
+    horizontal = vertical = 0
+    for line in page.lines:
+        # Same orientation rule as pdfplumber's line_to_edge.
+        if line["top"] == line["bottom"]:
+            horizontal += 1
+        else:
+            vertical += 1
+        if horizontal >= 2 and vertical >= 2:
+            return True
+    return False
+
+def format_table(rows: List[List[Optional[str]]]) -> Optional[str]:
+    """Render extracted table rows as "header:\n- value" sections, one per non-empty header column.
+
+    The first row is the header; a single-row table lists its own cells as values.
+    Returns None for an empty table.
+    """
+    width = max((len(row) for row in rows), default=0)
+    if width == 0:
+        return None
+    rows = [list(row) + [None] * (width - len(row)) for row in rows]
+
+    headers = rows[0]
+    body = rows[1:] if len(rows) > 1 else rows
+
+    table_text = []
+    for col_idx, header in enumerate(headers):
+        if header is None or str(header).strip() == "":
+            continue
+        col_values = [row[col_idx] for row in body if row[col_idx] is not None]
+        section = f"{header.strip()}:\n" + "\n".join(
+            f"- {str(val).strip()}" for val in col_values if str(val).strip()
+        )
+        table_text.append(section)
+
+    return "\n\n".join(table_text)
+
+def _text_lines(words: List[Dict], tolerance: float = 3) -> List[List[Dict]]:
+    """Group words (in reading order) into lines by their top coordinate."""
+    lines = []
+    for word in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if lines and abs(word["top"] - lines[-1][0]["top"]) <= tolerance:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    return lines
+
+def _caption_id(line: List[Dict]) -> Optional[str]:
+    if len(line) < 2 or line[0]["text"].lower() != "table":
+        return None
+    table_id = line[1]["text"].rstrip(".:,;")
+    return table_id if _TABLE_ID_RE.match(table_id) else None
+
+def _bbox(objs: List[Dict]) -> List[float]:
+    return [
+        round(min(o["x0"] for o in objs), 2),
+        round(min(o["top"] for o in objs), 2),
+        round(max(o["x1"] for o in objs), 2),
+        round(max(o["bottom"] for o in objs), 2),
+    ]
+
+def find_page_tables(page, tables: List[Tuple[object, str]]) -> List[Dict]:
+    """Registry records ({table_id, bbox, text}) for the tables of a page.
+
+    - ruled tables (``tables``: (pdfplumber table, formatted text) pairs) take the ID of the nearest
+      caption above them (whose line heads their text), else below them, else ``p<page>.<n>``
+    - a caption with no ruled table under it heads an unruled, text-laid-out table: the lines from
+      the caption down to the next caption or a wide vertical gap, kept in layout
+    """
+    bboxes = [table.bbox for table, _ in tables]
+    words = [
+        word for word in page.extract_words()
+        if all(get_bbox_overlap(obj_to_bbox(word), bbox) is None for bbox in bboxes)
+    ]
+    lines = _text_lines(words)
+    captions = {i: _caption_id(line) for i, line in enumerate(lines)}
+    captions = {i: table_id for i, table_id in captions.items() if table_id}
+
+    records = []
+    used = set()
+    for n, (table, text) in enumerate(tables, 1):
+        top, bottom = table.bbox[1], table.bbox[3]
+        above = [i for i in captions if i not in used and lines[i][0]["bottom"] <= top + 2]
+        below = [i for i in captions if i not in used and lines[i][0]["top"] >= bottom - 2]
+        caption = max(above, default=None)
+        if caption is None:
+            caption = min(below, default=None)
+        if caption is None:
+            table_id = f"p{page.page_number}.{n}"
+        else:
+            used.add(caption)
+            table_id = captions[caption]
+            text = " ".join(word["text"] for word in lines[caption]) + "\n" + text
+        records.append({'table_id': table_id, 'bbox': [round(v, 2) for v in table.bbox], 'text': text})
+
+    pitches = sorted(b[0]["top"] - a[0]["top"] for a, b in zip(lines, lines[1:]))
+    pitch = pitches[len(pitches) // 2] if pitches else 0
+    for start in sorted(set(captions) - used):
+        end = start + 1
+        while (
+            end < len(lines) and end not in captions
+            and lines[end][0]["top"] - lines[end - 1][0]["top"] <= _BLOCK_GAP * pitch
+            and not any(lines[end - 1][0]["bottom"] <= bbox[1] <= lines[end][0]["top"] for bbox in bboxes)
+        ):
+            end += 1
+        block = [word for line in lines[start:end] for word in line]
+        bbox = _bbox(block)
+        x0, top, x1, bottom = bbox
+        # Plain comparisons: this runs over every char of the page once per block.
+        chars = [
+            char for char in page.chars
+            if char["x1"] > x0 and char["x0"] < x1 and char["bottom"] > top and char["top"] < bottom
+            and all(get_bbox_overlap(obj_to_bbox(char), other) is None for other in bboxes)
+        ]
+        text = textwrap.dedent("\n".join(
+            line.rstrip() for line in extract_text(chars, layout=True).splitlines() if line.strip()
+        ))
+        records.append({'table_id': captions[start], 'bbox': bbox, 'text': text})
+    return records
+
+def extract_page(page, register_tables: bool = True) -> Dict:
+    """Extract one pdfplumber page, replacing each table with a header: - value listing.
+
+    ``tables`` lists the page's tables for the table registry (see find_page_tables);
+    it is left empty when ``register_tables`` is False.
+    """
+    page_number = page.page_number
+
+    try:
+        tables = page.find_tables(table_settings=TABLE_SETTINGS) if may_contain_table(page) else []
+        formatted_tables = []
+        if not tables:
+            chars = page.chars
+        else:
+            bboxes = [table.bbox for table in tables]
+            # One pass over the chars instead of re-filtering every page object once per table.
+            chars = [
+                char for char in page.chars
+                if all(get_bbox_overlap(obj_to_bbox(char), bbox) is None for bbox in bboxes)
+            ]
+            for i, table in enumerate(tables):
+                formatted_table = format_table(table.extract())
+                if formatted_table is None:
+                    continue
+                formatted_tables.append((table, formatted_table))
+                try:
+                    first_table_char = page.crop(table.bbox).chars[0]
+                except IndexError:
+                    first_table_char = {"x0": table.bbox[0], "y0": table.bbox[1], "text": ""}
+                # The text char stands in for the table unless a later table's area covers it.
+                if all(get_bbox_overlap(obj_to_bbox(first_table_char), bbox) is None for bbox in bboxes[i + 1:]):
+                    chars.append(first_table_char | {"text": formatted_table})
+
+        page_text = extract_text(chars, layout=True)
+        # Caption search is a regex over text already extracted; only caption pages pay for words.
+        page_tables = []
+        if register_tables and (formatted_tables or _CAPTION_RE.search(page_text)):
+            page_tables = find_page_tables(page, formatted_tables)
+        return {
+            'page_number': page_number,
+            'content': page_text,
+            'tables': page_tables
+        }
+
+    except Exception as e:
+        print(f"Error processing page {page_number}: {str(e)}")
+        page_text = page.extract_text()
+        return {
+            'page_number': page_number,
+            'content': page_text or "",
+            'tables': []
+        }
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> List[Dict]:
+    """Extract pages[start:end] with a pdfplumber handle owned by the caller's process."""
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = []
+        for page in pdf.pages[start:end]:
+            pages.append(extract_page(page))
+            # Release the parsed layout of finished pages; long PDFs otherwise keep every page in memory.
+            page.close()
+        return pages
+
+def iter_pdf_pages(pdf_path: str, workers: int = 1, shard_pages: int = SHARD_PAGES) -> Iterator[Dict]:
+    """Yield extracted pages in page order without holding the whole document in memory.
+
+    With ``workers > 1`` shards of ``shard_pages`` pages run on a process pool with at most
+    two shards per worker outstanding, so at most ``workers * 2 * shard_pages`` pages are
+    extracted ahead of the consumer.
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+
+    workers = max(1, min(workers, os.cpu_count() or 1, page_count))
+    if workers == 1:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                yield extract_page(page)
+                page.close()
+        return
+
+    # Small shards also keep the pool busy when some pages are much slower than others.
+    shard_size = max(1, shard_pages)
+    starts = deque(range(0, page_count, shard_size))
+    # spawn, not fork: ingest calls this from a pipeline thread while format/embed/daemon threads
+    # hold locks (torch, sqlite, stdout), and a forked child can inherit them locked.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        window = deque()
+        while starts or window:
+            while starts and len(window) < workers * 2:
+                start = starts.popleft()
+                window.append(pool.submit(extract_page_range, pdf_path, start, start + shard_size))
+            yield from window.popleft().result()
+
+def process_pdf_with_tables(pdf_path: str, workers: int = 1) -> List[Dict]:
+    """Extract PDF content with proper table formatting using pdfplumber.
+
+    With ``workers > 1`` the page range is sharded across a process pool; every worker
+    runs the same per-page code on its own pdfplumber handle and shards are merged in
+    page order, so the result is identical to the serial path.
+    """
+    try:
+        return list(iter_pdf_pages(pdf_path, workers=workers))
+    except Exception as e:
+        print(f"Error processing PDF: {str(e)}")
+        return []
@@ -0,0 +1,53 @@
+"""
+This module provides a persistent SQLite cache for LLM-formatted page text.
+"""
+
+import hashlib
+import time
+from typing import Optional
+from chatbot.sqlitestore import SqliteStore
+
+class FormattedPageCache(SqliteStore):
+    """Disk cache of format_with_llm output.
+
+    - Keyed by a hash of (prompt version, model, page number, raw page text), so
+      the same page is never sent to the LLM twice, whatever else changes in the pipeline
+    - Bump the prompt version whenever the formatting prompt changes
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS formatted_pages (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            prompt_version TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str):
+        self.hits = 0
+        self.misses = 0
+        super().__init__(path)
+
+    @staticmethod
+    def key(raw_content: str, page_number: int, model: str, prompt_version: str) -> str:
+        payload = "\x1f".join([prompt_version, model, str(page_number), raw_content])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, raw_content: str, page_number: int, model: str, prompt_version: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT content FROM formatted_pages WHERE key = ?",
+            (self.key(raw_content, page_number, model, prompt_version),),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, raw_content: str, page_number: int, model: str, prompt_version: str, content: str):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO formatted_pages (key, model, prompt_version, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (self.key(raw_content, page_number, model, prompt_version), model, prompt_version, content, time.time()),
+            )
@@ -0,0 +1,118 @@
+"""
+This module provides a persistent SQLite job queue for the ingest daemon.
+"""
+
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+from chatbot.sqlitestore import SqliteStore
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class JobQueue(SqliteStore):
+    """Durable queue of files to ingest.
+
+    - Jobs move queued -> running -> done, or back to queued on failure until
+      ``max_attempts`` is reached, then failed
+    - A job left running by a crash is re-queued by ``recover()`` on startup
+    - A path is never claimed twice at once, and re-enqueueing an already queued path is a no-op
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, id);
+        CREATE INDEX IF NOT EXISTS idx_jobs_path ON jobs (path, state);
+    """
+    CONNECT_KWARGS = {"isolation_level": None}
+    ROW_FACTORY = sqlite3.Row
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.max_attempts = max_attempts
+        super().__init__(path)
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, path: str) -> Optional[int]:
+        """Queue ``path`` unless it is already waiting; returns the new job id or None."""
+        def run(conn):
+            if conn.execute("SELECT 1 FROM jobs WHERE path = ? AND state = ?", (path, QUEUED)).fetchone():
+                return None
+            now = time.time()
+            cur = conn.execute(
+                "INSERT INTO jobs (path, state, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (path, QUEUED, now, now),
+            )
+            return cur.lastrowid
+        return self._transaction(run)
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest runnable job to running and return it."""
+        def run(conn):
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE state = ? AND path NOT IN "
+                "(SELECT path FROM jobs WHERE state = ?) ORDER BY id LIMIT 1",
+                (QUEUED, RUNNING),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, time.time(), row["id"]),
+            )
+            job = dict(row)
+            job["state"] = RUNNING
+            job["attempts"] += 1
+            return job
+        return self._transaction(run)
+
+    def complete(self, job_id: int):
+        self._conn().execute(
+            "UPDATE jobs SET state = ?, error = NULL, updated_at = ? WHERE id = ?",
+            (DONE, time.time(), job_id),
+        )
+
+    def fail(self, job_id: int, error: str):
+        """Record a failure; the job is retried until it has used up max_attempts."""
+        def run(conn):
+            row = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            state = QUEUED if row is not None and row["attempts"] < self.max_attempts else FAILED
+            conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE id = ?",
+                (state, error, time.time(), job_id),
+            )
+            return state
+        return self._transaction(run)
+
+    def recover(self) -> int:
+        """Re-queue jobs left running by a previous process that died mid-file."""
+        cur = self._conn().execute(
+            "UPDATE jobs SET state = ?, updated_at = ? WHERE state = ?",
+            (QUEUED, time.time(), RUNNING),
+        )
+        return cur.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({row["state"]: row["n"] for row in rows})
+        return counts
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
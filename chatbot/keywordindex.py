@@ -0,0 +1,177 @@
+"""
+This module provides an on-disk BM25 keyword index over chunks, built at ingest time.
+"""
+
+import heapq
+import math
+import re
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Tuple
+from chatbot.sqlitestore import SqliteStore
+
+# Runs of letters/digits, keeping identifiers such as "1.2.1", "2008-09" or "a/b" together.
+_TOKEN_RE = re.compile(r"[^\W_]+(?:[.\-/][^\W_]+)*")
+_PART_RE = re.compile(r"[.\-/]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "what when where which who will with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound identifiers are indexed whole and by their parts."""
+    terms = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in _PART_RE.split(token) if part and part not in STOPWORDS)
+    return terms
+
+class KeywordIndex(SqliteStore):
+    """Inverted index (term -> postings of chunk docs) with BM25 scoring, stored in SQLite.
+
+    - postings are keyed by (term, doc), so a term lookup is one B-tree range scan
+    - each posting carries the doc length, so scoring never joins back to the docs table
+    - doc count and total length are kept in a stats row instead of being aggregated per query
+    - rows mirror PageStore: (book_id, page_number, chunk_order, chunk_id, text)
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS docs (
+            doc INTEGER PRIMARY KEY,
+            chunk_id TEXT NOT NULL UNIQUE,
+            book_id TEXT NOT NULL,
+            page_number INTEGER NOT NULL,
+            chunk_order INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            terms TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS docs_page ON docs (book_id, page_number);
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            doc INTEGER NOT NULL,
+            tf INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            PRIMARY KEY (term, doc)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT OR IGNORE INTO stats VALUES ('doc_count', 0), ('total_length', 0);
+    """
+    CONNECT_KWARGS = {"isolation_level": None, "cached_statements": 64}
+    PRAGMAS = ("synchronous=NORMAL",)
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        super().__init__(path)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE: concurrent ingest workers read-then-write the stats row.
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _remove(conn: sqlite3.Connection, docs: List[Tuple[int, str, int]]):
+        if not docs:
+            return
+        conn.executemany(
+            "DELETE FROM postings WHERE term = ? AND doc = ?",
+            [(term, doc) for doc, terms, _ in docs for term in terms.split(" ") if term],
+        )
+        conn.executemany("DELETE FROM docs WHERE doc = ?", [(doc,) for doc, _, _ in docs])
+        conn.execute("UPDATE stats SET value = value - ? WHERE key = 'doc_count'", (len(docs),))
+        conn.execute(
+            "UPDATE stats SET value = value - ? WHERE key = 'total_length'",
+            (sum(length for _, _, length in docs),),
+        )
+
+    def put_chunks(self, rows: Iterable[Tuple[str, int, int, str, str]]):
+        """Index (book_id, page_number, chunk_order, chunk_id, text) rows, replacing earlier versions."""
+        with self._transaction() as conn:
+            for book_id, page_number, chunk_order, chunk_id, text in rows:
+                self._remove(conn, conn.execute(
+                    "SELECT doc, terms, length FROM docs WHERE chunk_id = ?"
+                    " OR (book_id = ? AND page_number = ? AND chunk_order = ?)",
+                    (chunk_id, book_id, page_number, chunk_order),
+                ).fetchall())
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                doc = conn.execute(
+                    "INSERT INTO docs (chunk_id, book_id, page_number, chunk_order, length, terms)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (chunk_id, book_id, page_number, chunk_order, length, " ".join(counts)),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO postings (term, doc, tf, length) VALUES (?, ?, ?, ?)",
+                    [(term, doc, tf, length) for term, tf in counts.items()],
+                )
+                conn.execute("UPDATE stats SET value = value + 1 WHERE key = 'doc_count'")
+                conn.execute("UPDATE stats SET value = value + ? WHERE key = 'total_length'", (length,))
+
+    def has_book(self, book_id: str) -> bool:
+        cur = self._conn().execute("SELECT 1 FROM docs WHERE book_id = ? LIMIT 1", (book_id,))
+        return cur.fetchone() is not None
+
+    def delete_page(self, book_id: str, page_number: int):
+        with self._transaction() as conn:
+            self._remove(conn, conn.execute(
+                "SELECT doc, terms, length FROM docs WHERE book_id = ? AND page_number = ?",
+                (book_id, page_number),
+            ).fetchall())
+
+    def delete_book(self, book_id: str):
+        with self._transaction() as conn:
+            self._remove(conn, conn.execute(
+                "SELECT doc, terms, length FROM docs WHERE book_id = ?", (book_id,)
+            ).fetchall())
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[float, str, str, int, int]]:
+        """
+        BM25 search.
+
+        Returns:
+            List of (score, chunk_id, book_id, page_number, chunk_order), best first
+        """
+        terms = Counter(tokenize(query))
+        if not terms or top_k <= 0:
+            return []
+        conn = self._conn()
+        stats = dict(conn.execute("SELECT key, value FROM stats").fetchall())
+        doc_count = stats.get("doc_count", 0)
+        if doc_count <= 0:
+            return []
+        avg_length = max(stats.get("total_length", 0) / doc_count, 1e-9)
+
+        scores = {}
+        for term, query_tf in terms.items():
+            postings = conn.execute("SELECT doc, tf, length FROM postings WHERE term = ?", (term,)).fetchall()
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf, length in postings:
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc] = scores.get(doc, 0.0) + query_tf * idf * tf * (self.k1 + 1) / norm
+
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        if not top:
+            return []
+        placeholders = ",".join("?" * len(top))
+        docs = {
+            row[0]: row[1:]
+            for row in conn.execute(
+                f"SELECT doc, chunk_id, book_id, page_number, chunk_order FROM docs WHERE doc IN ({placeholders})",
+                [doc for doc, _ in top],
+            )
+        }
+        return [(score, *docs[doc]) for doc, score in top if doc in docs]
@@ -1,7 +1,7 @@
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any
 import base64
 import os
-from groq import Groq
+from groq import AsyncGroq, Groq
 from chatbot.config import Settings
 
 settings = Settings()
@@ -18,6 +18,15 @@ except Exception as e:
         print(f"Alternative Groq initialization also failed: {e2}")
         groq_client = None
 
+try:
+    async_groq_client = AsyncGroq(api_key=settings.groq_api_key)
+except Exception as e:
+    print(f"Error initializing async Groq client: {e}")
+    async_groq_client = None
+
+CHAT_MODEL = "llama-3.3-70b-versatile"
+VISION_MODEL = "meta-llama/llama-4-maverick-17b-128e-instruct"
+
 SYSTEM_PROMPT = """You answer questions about a financial policy document using provided context.
 Rules:
 - Use the supplied CONTEXT for facts. If missing, say you don't know.
@@ -41,13 +50,10 @@ def _format_context(contexts: List[Dict[str, Any]]) -> str:
         parts.append(f"[{book_id}, p.{pg}] {txt}")
     return "\n".join(parts[:10])
 
-def answer_with_context(question: str, contexts: List[Dict[str, Any]], chat_history: List[Dict[str,str]], summary: str) -> str:
-    if groq_client is None:
-        return "Error: Groq client not properly initialized. Please check your API key and dependencies."
-    
+def build_prompt(question: str, contexts: List[Dict[str, Any]], chat_history: List[Dict[str,str]], summary: str) -> str:
     context_block = _format_context(contexts)
     history_block = "\n".join([f"{h['role']}: {h['content']}" for h in chat_history[-6:]])
-    prompt = f"""{SYSTEM_PROMPT}
+    return f"""{SYSTEM_PROMPT}
 
 CONTEXT:
 {context_block}
@@ -66,39 +72,106 @@ Take the {context_block} and use/utilize it to answer the question.\n
 Write the best possible answer with citations to pages you used.
 """
 
+def _chat_messages(question: str, contexts: List[Dict[str, Any]], chat_history: List[Dict[str,str]], summary: str) -> List[Dict[str, str]]:
+    return [
+        {"role":"system","content":SYSTEM_PROMPT},
+        {"role":"user","content":build_prompt(question, contexts, chat_history, summary)},
+    ]
+
+def generate_answer(question: str, contexts: List[Dict[str, Any]], chat_history: List[Dict[str,str]], summary: str) -> str:
+    """Like answer_with_context, but raises instead of returning an error string."""
+    if groq_client is None:
+        raise RuntimeError("Groq client not properly initialized. Please check your API key and dependencies.")
+
+    resp = groq_client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=_chat_messages(question, contexts, chat_history, summary),
+    )
+    return resp.choices[0].message.content.strip()
+
+async def agenerate_answer(question: str, contexts: List[Dict[str, Any]], chat_history: List[Dict[str,str]], summary: str) -> str:
+    """Async version of generate_answer; awaits the completion without holding a thread."""
+    if async_groq_client is None:
+        raise RuntimeError("Groq client not properly initialized. Please check your API key and dependencies.")
+
+    resp = await async_groq_client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=_chat_messages(question, contexts, chat_history, summary),
+    )
+    return resp.choices[0].message.content.strip()
+
+def answer_with_context(question: str, contexts: List[Dict[str, Any]], chat_history: List[Dict[str,str]], summary: str) -> str:
+    if groq_client is None:
+        return "Error: Groq client not properly initialized. Please check your API key and dependencies."
+
     try:
-        resp = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role":"system","content":SYSTEM_PROMPT},
-                {"role":"user","content":prompt},
-            ],
-        )
-        return resp.choices[0].message.content.strip()
+        return generate_answer(question, contexts, chat_history, summary)
     except Exception as e:
         return f"Error generating response: {e}"
 
-def vision_answer(prompt: str, base64_image: str) -> str:
-    if groq_client is None:
+async def stream_answer(question: str, contexts: List[Dict[str, Any]], chat_history: List[Dict[str,str]], summary: str) -> AsyncIterator[str]:
+    """Yield answer tokens as Groq produces them. Raises on client/API errors."""
+    if async_groq_client is None:
+        raise RuntimeError("Groq client not properly initialized. Please check your API key and dependencies.")
+
+    stream = await async_groq_client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=_chat_messages(question, contexts, chat_history, summary),
+        stream=True,
+    )
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        token = chunk.choices[0].delta.content
+        if token:
+            yield token
+
+async def answer_with_context_async(question: str, contexts: List[Dict[str, Any]], chat_history: List[Dict[str,str]], summary: str) -> str:
+    if async_groq_client is None:
         return "Error: Groq client not properly initialized. Please check your API key and dependencies."
-    
+
+    try:
+        return await agenerate_answer(question, contexts, chat_history, summary)
+    except Exception as e:
+        return f"Error generating response: {e}"
+
+def _vision_messages(prompt: str, base64_image: str) -> List[Dict[str, Any]]:
     if base64_image.startswith("data:"):
         image_url = base64_image
     else:
         image_url = f"data:image/jpeg;base64,{base64_image}"
 
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": image_url}},
+            ],
+        }
+    ]
+
+def vision_answer(prompt: str, base64_image: str) -> str:
+    if groq_client is None:
+        return "Error: Groq client not properly initialized. Please check your API key and dependencies."
+
     try:
         resp = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": image_url}},
-                    ],
-                }
-            ],
-            model="meta-llama/llama-4-maverick-17b-128e-instruct",
+            messages=_vision_messages(prompt, base64_image),
+            model=VISION_MODEL,
+        )
+        return resp.choices[0].message.content.strip()
+    except Exception as e:
+        return f"Error generating vision response: {e}"
+
+async def vision_answer_async(prompt: str, base64_image: str) -> str:
+    if async_groq_client is None:
+        return "Error: Groq client not properly initialized. Please check your API key and dependencies."
+
+    try:
+        resp = await async_groq_client.chat.completions.create(
+            messages=_vision_messages(prompt, base64_image),
+            model=VISION_MODEL,
         )
         return resp.choices[0].message.content.strip()
     except Exception as e:
@@ -2,62 +2,320 @@
 This module provides a simple file-based memory store for user sessions.
 """
 
+import atexit
+import copy
 import os, json
-from typing import List, Dict
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+from chatbot.sqlitestore import SqliteStore
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+def _apply_turn(data: Dict, user: str, assistant: str, max_turns: int):
+    """Append a user/assistant turn to session data and update the running summary."""
+    data["history"].append({"role": "user", "content": user})
+    data["history"].append({"role": "assistant", "content": assistant})
+    data["history"] = data["history"][-(2*max_turns):]
+
+    if not data["summary"] and assistant:
+        first_sent = assistant.split(".")[0].strip()
+        data["summary"] = first_sent
+    else:
+        data["summary"] = (data.get("summary","")[:300] + " | last_topic: " + user[:100]).strip()
 
 class MemoryStore:
     """Very small, file-backed memory per session_id.
 
     - Keeps last N turns
     - Maintains a lightweight running summary (first assistant answer + last user topic)
+    - Sessions are parsed once and kept in an in-process LRU cache; turns are written
+      back by a background flusher every ``flush_interval`` seconds (0 = write-through).
+    - Writes go to a temp file that is swapped in with ``os.replace`` while holding a
+      striped in-process lock and a cross-process file lock for the session. If another
+      worker rewrote the file since it was loaded, pending turns are replayed on top of
+      the on-disk version instead of overwriting it.
     """
-    def __init__(self, base_dir: str = "sessions", max_turns: int = 6):
+    def __init__(self, base_dir: str = "sessions", max_turns: int = 6,
+                 flush_interval: float = 1.0, max_cached_sessions: int = 10000,
+                 lock_stripes: int = 64):
         self.base_dir = base_dir
         self.max_turns = max_turns
-        os.makedirs(self.base_dir, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.max_cached_sessions = max_cached_sessions
+        self.lock_dir = os.path.join(self.base_dir, ".locks")
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+        # Guards the cache/pending dicts only; per-session work runs under a striped lock.
+        self._lock = threading.RLock()
+        self._stripes = [threading.RLock() for _ in range(lock_stripes)]
+        # session_id -> (data, signature of the file the data was read from / written to)
+        self._cache: "OrderedDict[str, Tuple[Dict, Optional[int]]]" = OrderedDict()
+        # session_id -> [(user, assistant), ...] turns not yet written to disk
+        self._pending: Dict[str, List[Tuple[str, str]]] = {}
+        self._wake = threading.Event()
+        self._closed = False
+        if self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="memory-flush", daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
 
     def _path(self, session_id: str) -> str:
         return os.path.join(self.base_dir, f"{session_id}.json")
 
-    def get_history(self, session_id: str) -> List[Dict[str, str]]:
-        p = self._path(session_id)
+    def _stripe(self, session_id: str) -> int:
+        # crc32 rather than hash(): stripes must agree across worker processes for the file locks.
+        return zlib.crc32(session_id.encode("utf-8")) % len(self._stripes)
+
+    @contextmanager
+    def _session_lock(self, session_id: str):
+        """Serialize work on one session across threads and processes without blocking other stripes."""
+        stripe = self._stripe(session_id)
+        with self._stripes[stripe]:
+            with open(os.path.join(self.lock_dir, f"{stripe}.lock"), "a+") as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                    else:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def _signature(p: str) -> Optional[Tuple[int, int, int]]:
+        """(inode, mtime, size) of a session file. mtime alone misses a write by another worker in
+        the same timestamp tick on coarse-grained filesystems; every write is an os.replace, so a
+        new inode."""
+        try:
+            st = os.stat(p)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read(self, p: str) -> Dict:
         if not os.path.exists(p):
-            return []
+            return {"history": [], "summary": ""}
         try:
             with open(p, "r", encoding="utf-8") as f:
                 data = json.load(f)
-            return data.get("history", [])
+            data.setdefault("history", [])
+            data.setdefault("summary", "")
+            return data
         except Exception:
-            return []
+            return {"history": [], "summary": ""}
+
+    def _load(self, session_id: str) -> Dict:
+        """Return the cached session, re-reading it only if another process changed the file.
+
+        Callers hold the session's stripe lock.
+        """
+        p = self._path(session_id)
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is not None:
+                data, signature = entry
+                if session_id in self._pending or self._signature(p) == signature:
+                    self._cache.move_to_end(session_id)
+                    return data
+        signature = self._signature(p)
+        data = self._read(p)
+        with self._lock:
+            self._cache[session_id] = (data, signature)
+            self._evict()
+        return data
+
+    def _evict(self):
+        while len(self._cache) > self.max_cached_sessions:
+            for session_id in self._cache:
+                if session_id not in self._pending:
+                    del self._cache[session_id]
+                    break
+            else:
+                return
+
+    def get_session(self, session_id: str) -> Tuple[List[Dict[str, str]], str]:
+        """History and summary from a single load of the session."""
+        with self._stripes[self._stripe(session_id)]:
+            data = self._load(session_id)
+            return copy.deepcopy(data["history"]), data.get("summary", "")
+
+    def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        return self.get_session(session_id)[0]
 
     def get_summary(self, session_id: str) -> str:
+        return self.get_session(session_id)[1]
+
+    def append_turn(self, session_id: str, user: str, assistant: str):
+        with self._stripes[self._stripe(session_id)]:
+            data = self._load(session_id)
+            _apply_turn(data, user, assistant, self.max_turns)
+            with self._lock:
+                self._pending.setdefault(session_id, []).append((user, assistant))
+
+        if self.flush_interval <= 0:
+            self._flush_session(session_id)
+        else:
+            self._wake.set()
+
+    def _write(self, session_id: str, data: Dict) -> Optional[Tuple[int, int, int]]:
         p = self._path(session_id)
-        if not os.path.exists(p):
-            return ""
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, p)
+        return self._signature(p)
+
+    def _flush_session(self, session_id: str):
+        with self._session_lock(session_id):
+            with self._lock:
+                pending = self._pending.pop(session_id, None)
+                entry = self._cache.get(session_id)
+            if not pending or entry is None:
+                return
+            data, signature = entry
+            p = self._path(session_id)
+            try:
+                if self._signature(p) != signature:
+                    # Another worker wrote this session since we loaded it: replay our turns on its version.
+                    data = self._read(p)
+                    for user, assistant in pending:
+                        _apply_turn(data, user, assistant, self.max_turns)
+                signature = self._write(session_id, data)
+            except Exception as e:
+                print(f"Error writing session {session_id}: {e}")
+                with self._lock:
+                    self._pending[session_id] = pending + self._pending.get(session_id, [])
+                return
+            with self._lock:
+                self._cache[session_id] = (data, signature)
+
+    def flush(self):
+        """Write every session with pending turns to disk."""
+        with self._lock:
+            session_ids = list(self._pending)
+        for session_id in session_ids:
+            self._flush_session(session_id)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                break
+            self.flush()
+            # Coalesce bursts of turns into one write per interval.
+            time.sleep(self.flush_interval)
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+
+class SqliteMemoryStore(SqliteStore):
+    """SQLite-backed memory with the same API as MemoryStore.
+
+    - One row per session (history as JSON, summary, last_activity), indexed on
+      session_id (primary key) and last_activity
+    - WAL mode, so several uvicorn workers can share one database file
+    - append_turn runs in a BEGIN IMMEDIATE transaction, so concurrent turns never overwrite each other
+    """
+    _SELECT = "SELECT history, summary FROM sessions WHERE session_id = ?"
+    _UPSERT = (
+        "INSERT INTO sessions (session_id, history, summary, last_activity) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(session_id) DO UPDATE SET history = excluded.history, "
+        "summary = excluded.summary, last_activity = excluded.last_activity"
+    )
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            history TEXT NOT NULL,
+            summary TEXT NOT NULL DEFAULT '',
+            last_activity REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions (last_activity);
+    """
+    # sqlite3 caches the prepared statements per connection.
+    CONNECT_KWARGS = {"isolation_level": None, "cached_statements": 64}
+    PRAGMAS = ("synchronous=NORMAL",)
+
+    def __init__(self, db_path: str = "store/sessions.db", max_turns: int = 6):
+        self.db_path = db_path
+        self.max_turns = max_turns
+        super().__init__(db_path)
+
+    def get_session(self, session_id: str) -> Tuple[List[Dict[str, str]], str]:
+        row = self._conn().execute(self._SELECT, (session_id,)).fetchone()
+        if row is None:
+            return [], ""
         try:
-            with open(p, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            return data.get("summary", "")
+            return json.loads(row[0]), row[1] or ""
         except Exception:
-            return ""
+            return [], row[1] or ""
+
+    def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        return self.get_session(session_id)[0]
+
+    def get_summary(self, session_id: str) -> str:
+        return self.get_session(session_id)[1]
 
     def append_turn(self, session_id: str, user: str, assistant: str):
-        p = self._path(session_id)
-        if os.path.exists(p):
-            with open(p, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        else:
-            data = {"history": [], "summary": ""}
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            history, summary = self.get_session(session_id)
+            data = {"history": history, "summary": summary}
+            _apply_turn(data, user, assistant, self.max_turns)
+            conn.execute(
+                self._UPSERT,
+                (session_id, json.dumps(data["history"], ensure_ascii=False), data["summary"], time.time()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
 
-        data["history"].append({"role": "user", "content": user})
-        data["history"].append({"role": "assistant", "content": assistant})
-        data["history"] = data["history"][-(2*self.max_turns):]
+    def import_sessions(self, records: List[Tuple[str, List[Dict[str, str]], str, float]]) -> int:
+        """Bulk-insert (session_id, history, summary, last_activity) records in one transaction."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                self._UPSERT,
+                [
+                    (sid, json.dumps(history, ensure_ascii=False), summary or "", last_activity)
+                    for sid, history, summary, last_activity in records
+                ],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(records)
 
-        if not data["summary"] and assistant:
-            first_sent = assistant.split(".")[0].strip()
-            data["summary"] = first_sent
-        else:
-            data["summary"] = (data.get("summary","")[:300] + " | last_topic: " + user[:100]).strip()
+    def flush(self):
+        """Nothing to flush; every turn is committed immediately."""
 
-        with open(p, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def create_memory_store(settings):
+    """Return the session memory backend selected by ``settings.memory_backend``."""
+    if settings.memory_backend == "sqlite":
+        return SqliteMemoryStore(db_path=settings.sessions_db_path, max_turns=6)
+    return MemoryStore(base_dir="sessions", max_turns=6, flush_interval=settings.session_flush_interval)
@@ -0,0 +1,145 @@
+"""
+This module provides a SQLite sidecar store of chunk text keyed by page.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from chatbot.sqlitestore import SqliteStore
+
+class PageStore(SqliteStore):
+    """Page-keyed chunk store written at ingest time.
+
+    - Rows are keyed by (book_id, page_number, chunk_order), so fetching a page is an index lookup
+    - Lets /page be served without issuing a filtered dummy-vector query
+    - An adjacency map (links) of each chunk's previous/next chunk in reading order, across page
+      breaks, lets retrieval widen a hit to its neighbours without another vector query
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chunks (
+            book_id TEXT NOT NULL,
+            page_number INTEGER NOT NULL,
+            chunk_order INTEGER NOT NULL,
+            chunk_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (book_id, page_number, chunk_order)
+        ) WITHOUT ROWID;
+        -- overlap: leading chars of this chunk repeated from the end of the previous one (splitter overlap).
+        CREATE TABLE IF NOT EXISTS links (
+            book_id TEXT NOT NULL,
+            page_number INTEGER NOT NULL,
+            chunk_order INTEGER NOT NULL,
+            prev_page INTEGER,
+            prev_order INTEGER,
+            next_page INTEGER,
+            next_order INTEGER,
+            overlap INTEGER NOT NULL,
+            PRIMARY KEY (book_id, page_number, chunk_order)
+        ) WITHOUT ROWID;
+    """
+
+    def put_chunks(self, rows: Iterable[Tuple[str, int, int, str, str]]):
+        """Insert or replace (book_id, page_number, chunk_order, chunk_id, text) rows."""
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (book_id, page_number, chunk_order, chunk_id, text) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def get_page(self, book_id: str, page_number: int) -> List[str]:
+        cur = self._conn().execute(
+            "SELECT text FROM chunks WHERE book_id = ? AND page_number = ? ORDER BY chunk_order",
+            (book_id, page_number),
+        )
+        return [row[0] for row in cur.fetchall()]
+
+    def get_chunk(self, book_id: str, page_number: int, chunk_order: int) -> Optional[str]:
+        cur = self._conn().execute(
+            "SELECT text FROM chunks WHERE book_id = ? AND page_number = ? AND chunk_order = ?",
+            (book_id, page_number, chunk_order),
+        )
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    def get_book(self, book_id: str) -> List[Tuple[str, int, int, str, str]]:
+        """All (book_id, page_number, chunk_order, chunk_id, text) rows of a book, in page order."""
+        cur = self._conn().execute(
+            "SELECT book_id, page_number, chunk_order, chunk_id, text FROM chunks WHERE book_id = ?"
+            " ORDER BY page_number, chunk_order",
+            (book_id,),
+        )
+        return cur.fetchall()
+
+    @staticmethod
+    def _overlap(prev_text: str, text: str, max_overlap: int, min_overlap: int = 20) -> int:
+        for size in range(min(max_overlap, len(prev_text), len(text)), min_overlap - 1, -1):
+            if prev_text.endswith(text[:size]):
+                return size
+        return 0
+
+    def link_book(self, book_id: str, max_overlap: int = 200):
+        """Rebuild the adjacency map of a book from its stored chunks.
+
+        ``max_overlap`` bounds the search for text a chunk shares with its predecessor on the same
+        page (the splitter's chunk_overlap); neighbours are returned without it.
+        """
+        rows = self.get_book(book_id)
+        links = []
+        for i, (_, page_number, chunk_order, _, text) in enumerate(rows):
+            prev = rows[i - 1] if i > 0 else None
+            nxt = rows[i + 1] if i + 1 < len(rows) else None
+            overlap = self._overlap(prev[4], text, max_overlap) if prev and prev[1] == page_number else 0
+            links.append((
+                book_id, page_number, chunk_order,
+                prev[1] if prev else None, prev[2] if prev else None,
+                nxt[1] if nxt else None, nxt[2] if nxt else None,
+                overlap,
+            ))
+        with self._conn() as conn:
+            conn.execute("DELETE FROM links WHERE book_id = ?", (book_id,))
+            conn.executemany("INSERT INTO links VALUES (?, ?, ?, ?, ?, ?, ?, ?)", links)
+
+    def has_links(self, book_id: str) -> bool:
+        cur = self._conn().execute("SELECT 1 FROM links WHERE book_id = ? LIMIT 1", (book_id,))
+        return cur.fetchone() is not None
+
+    def neighbour(self, book_id: str, page_number: int, chunk_order: int, side: str) -> Optional[Dict]:
+        """
+        The chunk before (``side="prev"``) or after (``side="next"``) a chunk in reading order.
+
+        Returns:
+            {chunk_id, page_number, chunk_order, text} with the text shared with this chunk cut off,
+            or None at the start/end of the book or when the book has no adjacency map
+        """
+        if side == "prev":
+            # This chunk's overlap is the tail of the previous chunk.
+            query = (
+                "SELECT c.chunk_id, c.page_number, c.chunk_order, c.text, l.overlap FROM links l"
+                " JOIN chunks c ON c.book_id = l.book_id AND c.page_number = l.prev_page AND c.chunk_order = l.prev_order"
+                " WHERE l.book_id = ? AND l.page_number = ? AND l.chunk_order = ?"
+            )
+        else:
+            # The next chunk's overlap is its own head.
+            query = (
+                "SELECT c.chunk_id, c.page_number, c.chunk_order, c.text, n.overlap FROM links l"
+                " JOIN chunks c ON c.book_id = l.book_id AND c.page_number = l.next_page AND c.chunk_order = l.next_order"
+                " JOIN links n ON n.book_id = l.book_id AND n.page_number = l.next_page AND n.chunk_order = l.next_order"
+                " WHERE l.book_id = ? AND l.page_number = ? AND l.chunk_order = ?"
+            )
+        row = self._conn().execute(query, (book_id, page_number, chunk_order)).fetchone()
+        if row is None:
+            return None
+        chunk_id, page, order, text, overlap = row
+        text = text[:len(text) - overlap] if side == "prev" else text[overlap:]
+        return {"chunk_id": chunk_id, "page_number": page, "chunk_order": order, "text": text}
+
+    def has_book(self, book_id: str) -> bool:
+        cur = self._conn().execute("SELECT 1 FROM chunks WHERE book_id = ? LIMIT 1", (book_id,))
+        return cur.fetchone() is not None
+
+    def delete_page(self, book_id: str, page_number: int):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM chunks WHERE book_id = ? AND page_number = ?", (book_id, page_number))
+
+    def delete_book(self, book_id: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM chunks WHERE book_id = ?", (book_id,))
+            conn.execute("DELETE FROM links WHERE book_id = ?", (book_id,))
@@ -0,0 +1,80 @@
+"""
+Client-side pacing and retry helpers for rate-limited APIs (Groq, Pinecone).
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``.
+
+    ``rate <= 0`` disables pacing.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, seconds: float):
+        """Drain the bucket so every caller backs off for ``seconds`` (e.g. after a 429)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Full-jitter exponential backoff for the given 0-based attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_with_backoff(
+    fn: Callable[[], T],
+    retry_on: Tuple[Type[BaseException], ...],
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    on_retry: Optional[Callable[[BaseException, int, float], None]] = None,
+    delay_hint: Optional[Callable[[BaseException], Optional[float]]] = None,
+    retry_if: Optional[Callable[[BaseException], bool]] = None,
+) -> T:
+    """Call ``fn`` and retry ``retry_on`` errors with jittered exponential backoff.
+
+    ``delay_hint`` may return a server-provided delay (e.g. Retry-After) that takes precedence.
+    ``retry_if`` can veto retrying a particular error (e.g. a 400 that will never succeed).
+    The last error is re-raised once ``max_retries`` retries are used up.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except retry_on as e:
+            if attempt >= max_retries or (retry_if is not None and not retry_if(e)):
+                raise
+            delay = delay_hint(e) if delay_hint else None
+            if delay is None:
+                delay = backoff_delay(attempt, base_delay, max_delay)
+            if on_retry:
+                on_retry(e, attempt + 1, delay)
+            time.sleep(delay)
+            attempt += 1
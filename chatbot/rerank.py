@@ -0,0 +1,133 @@
+"""
+Optional cross-encoder rerank stage for retrieval candidates.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from chatbot.cache import LRUCache
+
+class Reranker:
+    """
+    Rescores (query, chunk) pairs with a cross-encoder.
+
+    - all uncached pairs of a request are scored in one batched predict call
+    - scores are cached per (query, chunk_id); chunk ids change whenever chunk text does
+    - latency budget: the cost per character of (query, chunk) text is tracked from past calls
+      (moving average), and a request only scores as many pairs as fit in ``budget_ms``
+      (none fit = rerank skipped)
+    """
+    def __init__(self, model_name: str, budget_ms: float, cache_size: int = 4096, cache_ttl: float = 0):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name)
+        self.budget_ms = budget_ms
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self._lock = threading.Lock()
+        self._ms_per_char = None
+        self.calls = 0
+        self.pairs_scored = 0
+        self.truncated = 0
+        self.skipped = 0
+        self.total_ms = 0.0
+
+    def _fit(self, sizes: List[int]) -> int:
+        """How many of the pending pairs (text sizes, in order) fit the budget; all before the first measurement."""
+        with self._lock:
+            if self._ms_per_char is None:
+                return len(sizes)
+            fit, cost = 0, 0.0
+            for size in sizes:
+                cost += size * self._ms_per_char
+                if cost > self.budget_ms:
+                    break
+                fit += 1
+            if fit == 0:
+                # Let a stale high estimate decay so a skipped stage gets re-measured eventually.
+                self._ms_per_char *= 0.9
+            return fit
+
+    def _record(self, pairs: int, chars: int, elapsed_ms: float):
+        with self._lock:
+            per_char = elapsed_ms / max(chars, 1)
+            if self._ms_per_char is None:
+                self._ms_per_char = per_char
+            else:
+                self._ms_per_char = 0.8 * self._ms_per_char + 0.2 * per_char
+            self.pairs_scored += pairs
+            self.total_ms += elapsed_ms
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Uncached, unbudgeted scores for (query, text) pairs in one forward pass."""
+        if not texts:
+            return []
+        start = time.perf_counter()
+        scores = self.model.predict(
+            [(query, text) for text in texts], batch_size=len(texts), show_progress_bar=False
+        )
+        chars = sum(len(query) + len(text) for text in texts)
+        self._record(len(texts), chars, (time.perf_counter() - start) * 1000)
+        return [float(s) for s in scores]
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Reorder vector-store-style result dicts by cross-encoder score.
+
+        Only the first ``limit`` candidates are eligible. Reranked candidates get the cross-encoder
+        score as ``_score``; the rest (over the limit or the budget) keep their order after them,
+        at the lowest reranked score, so results stay sorted by ``_score``.
+        """
+        if not candidates:
+            return candidates
+        self.calls += 1
+        scores = {}
+        pending = []
+        for i, candidate in enumerate(candidates[:limit]):
+            cached = self.cache.get((query, candidate.get("_id")))
+            if cached is not None:
+                scores[i] = cached
+            else:
+                pending.append(i)
+
+        fit = self._fit([len(query) + len(candidates[i].get("text", "")) for i in pending])
+        if fit < len(pending):
+            # Keep the best first-stage candidates when the budget can't cover all of them.
+            pending = pending[:fit]
+            self.truncated += 1
+        if pending:
+            predicted = self.score(query, [candidates[i].get("text", "") for i in pending])
+            for i, value in zip(pending, predicted):
+                scores[i] = value
+                self.cache.put((query, candidates[i].get("_id")), value)
+        if not scores:
+            self.skipped += 1
+            return candidates
+
+        ranked = sorted(scores, key=lambda i: scores[i], reverse=True)
+        floor = scores[ranked[-1]]
+        out = [dict(candidates[i], _score=scores[i]) for i in ranked]
+        out.extend(dict(c, _score=floor) for i, c in enumerate(candidates) if i not in scores)
+        return out
+
+    def warmup(self, pairs: int = 8):
+        """Run two dummy passes of chunk-sized text; the second seeds the cost estimate."""
+        texts = ["warmup passage " * 60] * max(1, pairs)
+        self.score("warmup query", texts)
+        with self._lock:
+            self._ms_per_char = None
+        self.score("warmup query", texts)
+        with self._lock:
+            self.pairs_scored = 0
+            self.total_ms = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "pairs_scored": self.pairs_scored,
+                "truncated": self.truncated,
+                "skipped": self.skipped,
+                "ms_per_pair": round(self.total_ms / self.pairs_scored, 3) if self.pairs_scored else None,
+                "total_ms": round(self.total_ms, 1),
+                "cache": self.cache.stats(),
+            }
@@ -1,18 +1,95 @@
-from typing import List, Dict, Tuple
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple, Union
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from chatbot.cache import LRUCache
 from chatbot.config import Settings
-from chatbot.vectorstore import PineconeStore
+from chatbot.embeddings import create_embedder
+from chatbot.keywordindex import KeywordIndex
+from chatbot.pagestore import PageStore
+from chatbot.rerank import Reranker
+from chatbot.tableregistry import TableRegistry
+from chatbot.vectorstore import create_vector_store
+
+# "Table 1.2.1", "tables 1.2.1 and 1.2.2": the IDs that extraction.find_page_tables registers.
+_TABLE_REF_RE = re.compile(r"\btables?\s+(\d+(?:\.\d+)+(?:\s*(?:,|and|&)\s*\d+(?:\.\d+)+)*)", re.IGNORECASE)
+_TABLE_ID_RE = re.compile(r"\d+(?:\.\d+)+")
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; close enough for a context budget.
+    return (len(text) + 3) // 4
 
 class Retriever:
     def __init__(self, settings: Settings):
         self.settings = settings
-        self.model = SentenceTransformer(settings.embedding_model_name)
-        self.store = PineconeStore(settings=settings)
+        self.model = create_embedder(settings)
+        self.store = create_vector_store(settings)
+        self.page_store = PageStore(settings.page_store_path)
+        self.keyword_index = KeywordIndex(settings.keyword_index_path)
+        self.table_registry = TableRegistry(settings.table_registry_path)
+        self.reranker = None
+        if settings.rerank_candidates > 0:
+            self.reranker = Reranker(
+                settings.rerank_model_name,
+                budget_ms=settings.rerank_budget_ms,
+                cache_size=settings.rerank_cache_size,
+                cache_ttl=settings.embedding_cache_ttl,
+            )
+        self.embedding_cache = LRUCache(
+            maxsize=settings.embedding_cache_size, ttl=settings.embedding_cache_ttl
+        )
+        self.embed_executor = ThreadPoolExecutor(
+            max_workers=settings.embedding_workers, thread_name_prefix="embed"
+        )
+
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        # all-MiniLM-L6-v2 is uncased and ignores whitespace runs, so this doesn't change the embedding.
+        return " ".join(text.split()).lower()
 
     def embed(self, text: str) -> List[float]:
         """Generate embeddings for the given text, matching ingest.py approach."""
-        return self.model.encode([text]).tolist()[0]
+        key = self._cache_key(text)
+        cached = self.embedding_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        return self._encode(key, text)
+
+    def _encode(self, key: str, text: str) -> List[float]:
+        embedding = self.model.encode([text]).tolist()[0]
+        self.embedding_cache.put(key, tuple(embedding))
+        return embedding
+
+    async def aembed(self, text: str) -> List[float]:
+        """Async embed: cache hits return inline, misses run on the dedicated embedding executor."""
+        key = self._cache_key(text)
+        cached = self.embedding_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.embed_executor, self._encode, key, text)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed many texts with a single batched encode; cached and duplicate texts are encoded once."""
+        out: List[List[float]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            key = self._cache_key(text)
+            cached = self.embedding_cache.get(key)
+            if cached is not None:
+                out[i] = list(cached)
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            keys = list(missing)
+            embeddings = self.model.encode([texts[missing[k][0]] for k in keys]).tolist()
+            for key, embedding in zip(keys, embeddings):
+                self.embedding_cache.put(key, tuple(embedding))
+                for i in missing[key]:
+                    out[i] = list(embedding)
+        return out
 
     def query_page(self, book_id: str, page_number: int) -> List[str]:
         """
@@ -26,11 +103,17 @@ class Retriever:
         Returns:
             List[str]: List of text chunks from the specified page
         """
+        # Books ingested before the page store existed still fall back to a filtered vector query.
+        if self.page_store.has_book(book_id):
+            return self.page_store.get_page(book_id, page_number)
         return self.store.query_page(book_id, page_number, self.settings.embedding_dim)
 
     def retrieve_relevant_docs(self, query: str, top_k: int = 5) -> List[Tuple[float, str, str, str, int]]:
         """
-        Retrieve relevant documents from vector store based on semantic similarity.
+        Retrieve relevant documents from vector store based on semantic similarity,
+        fused (RRF) with BM25 keyword hits so exact identifiers like "Table 1.2.1" are found.
+        Questions naming registered tables get the complete tables instead, without a vector search.
+        Each result is widened with its neighbouring chunks under a token budget (_expand_neighbours).
         
         Args:
             query (str): The query string
@@ -41,52 +124,285 @@ class Retriever:
                 (similarity_score, book_id, chunk_id, text_content, page_number)
         """
         try:
+            tables = self._table_lookup(query, top_k)
+            if tables is not None:
+                return tables
             query_embedding = self.embed(query)
             
-            raw_results = self.store.query(vector=query_embedding, top_k=top_k * 2)
-            
-            page_groups = {}
-            for result in raw_results:
-                page_num = result.get("page_number", 0)
-                book_id = result.get("book_id", "unknown")
-                key = f"{book_id}_{page_num}"
-                
-                if key not in page_groups:
-                    page_groups[key] = []
-                page_groups[key].append(result)
+            return self._retrieve(query, query_embedding, top_k)
             
-            processed_results = []
-            for key, chunks in page_groups.items():
-                sorted_chunks = sorted(chunks, key=lambda x: x.get("chunk_order", 0))
-                
-                if len(sorted_chunks) > 1 and len(processed_results) < top_k:
-                    combined_text = " ".join([chunk.get("text", "") for chunk in sorted_chunks])
-                    max_similarity = max([chunk.get("_score", 0.0) for chunk in sorted_chunks])
-                    
-                    processed_results.append((
-                        max_similarity,
-                        sorted_chunks[0].get("book_id", "unknown"),
-                        f"combined_{key}",
-                        combined_text,
-                        sorted_chunks[0].get("page_number", 0)
-                    ))
-                else:
-                    for chunk in sorted_chunks[:1]:  
-                        if len(processed_results) < top_k:
-                            processed_results.append((
-                                chunk.get("_score", 0.0),
-                                chunk.get("book_id", "unknown"),
-                                chunk.get("_id", "unknown"),
-                                chunk.get("text", ""),
-                                chunk.get("page_number", 0)
-                            ))
+        except Exception as e:
+            print(f"Error retrieving relevant documents: {e}")
+            return []
+
+    async def aretrieve_relevant_docs(self, query: str, top_k: int = 5) -> List[Tuple[float, str, str, str, int]]:
+        """
+        Async version of retrieve_relevant_docs for the async request path.
+        
+        Embedding runs on the dedicated embedding executor and the vector query is
+        offloaded to a worker thread, so the event loop is never blocked.
+        """
+        return (await self.aretrieve_with_embedding(query, top_k))[0]
+
+    async def aretrieve_with_embedding(self, query: str, top_k: int = 5) -> Tuple[List[Tuple[float, str, str, str, int]], Optional[List[float]]]:
+        """
+        aretrieve_relevant_docs that also returns the query embedding it searched with, so callers
+        (the semantic answer cache) don't embed the question again. The embedding is None when
+        none was computed: table-registry answers and failed retrievals.
+        """
+        try:
+            tables = self._table_lookup(query, top_k)
+            if tables is not None:
+                return tables, None
+            query_embedding = await self.aembed(query)
             
-            processed_results.sort(key=lambda x: x[0], reverse=True)
-            return processed_results[:top_k]
+            return await asyncio.to_thread(self._retrieve, query, query_embedding, top_k), query_embedding
             
         except Exception as e:
             print(f"Error retrieving relevant documents: {e}")
+            return [], None
+
+    def retrieve_relevant_docs_batch(self, queries: List[str], top_k: int = 5, max_workers: int = 8) -> List[Union[List[Tuple[float, str, str, str, int]], Exception]]:
+        """
+        Batched version of retrieve_relevant_docs (results only; see retrieve_batch_with_embeddings).
+        """
+        return [result for result, _ in self.retrieve_batch_with_embeddings(queries, top_k, max_workers)]
+
+    def retrieve_batch_with_embeddings(self, queries: List[str], top_k: int = 5, max_workers: int = 8) -> List[Tuple[Union[List[Tuple[float, str, str, str, int]], Exception], Optional[List[float]]]]:
+        """
+        Batched version of retrieve_relevant_docs that also returns each query's embedding.
+        
+        All queries are embedded in one encode call and the vector queries run
+        concurrently on a thread pool. Queries answered from the table registry are not embedded.
+        
+        Args:
+            queries (List[str]): The query strings
+            top_k (int): Number of top results to return per query
+            max_workers (int): Maximum number of concurrent vector queries
+            
+        Returns:
+            List: One (result, query embedding) pair per query, in input order. The result is
+                either the result list (same shape as retrieve_relevant_docs) or the exception
+                raised for that query; the embedding is None for queries that weren't embedded.
+        """
+        out: List = [None] * len(queries)
+        embeddings_out: List = [None] * len(queries)
+        pending = []
+        for i, query in enumerate(queries):
+            try:
+                out[i] = self._table_lookup(query, top_k)
+            except Exception as e:
+                out[i] = e
+            if out[i] is None:
+                pending.append(i)
+        if not pending:
+            return list(zip(out, embeddings_out))
+        embeddings = self.embed_batch([queries[i] for i in pending])
+        for i, query_embedding in zip(pending, embeddings):
+            embeddings_out[i] = query_embedding
+
+        def run(query, query_embedding):
+            try:
+                return self._retrieve(query, query_embedding, top_k)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+            results = pool.map(run, [queries[i] for i in pending], embeddings)
+            for i, result in zip(pending, results):
+                out[i] = result
+        return list(zip(out, embeddings_out))
+
+    def _table_lookup(self, query: str, top_k: int) -> Optional[List[Tuple[float, str, str, str, int]]]:
+        """
+        Complete tables for the table IDs a query names, read from the table registry.
+
+        A table split across pages is returned as one result, its parts joined in page order.
+
+        Returns:
+            Results shaped like retrieve_relevant_docs (score 1.0, one per table and book, not cut
+            to top_k), or None
+            when the query names no table or any named table isn't registered (use normal search)
+        """
+        table_ids = [
+            table_id
+            for match in _TABLE_REF_RE.finditer(query)
+            for table_id in _TABLE_ID_RE.findall(match.group(1))
+        ]
+        if not table_ids:
+            return None
+        results = []
+        for table_id in dict.fromkeys(table_ids):
+            parts = self.table_registry.lookup(table_id)
+            if not parts:
+                return None
+            by_book: Dict[str, List[Dict]] = {}
+            for part in parts:
+                by_book.setdefault(part["book_id"], []).append(part)
+            for book_id, book_parts in by_book.items():
+                results.append((
+                    1.0,
+                    book_id,
+                    f"table_{book_id}_{table_id}",
+                    "\n".join(part["text"] for part in book_parts),
+                    book_parts[0]["page_number"],
+                ))
+        return results
+
+    def _keyword_results(self, query: str) -> List[Dict]:
+        """BM25 hits shaped like vector store results (text comes from the page store)."""
+        if self.settings.keyword_top_k <= 0:
             return []
+        results = []
+        for score, chunk_id, book_id, page_number, chunk_order in self.keyword_index.search(
+            query, top_k=self.settings.keyword_top_k
+        ):
+            text = self.page_store.get_chunk(book_id, page_number, chunk_order)
+            if text is None:
+                continue
+            results.append({
+                "text": text,
+                "book_id": book_id,
+                "page_number": page_number,
+                "chunk_order": chunk_order,
+                "_id": chunk_id,
+                "_score": score,
+            })
+        return results
+
+    def _fuse(self, dense_results: List[Dict], keyword_results: List[Dict]) -> List[Dict]:
+        """
+        Reciprocal-rank fusion of the vector and keyword result lists.
+
+        Each chunk scores sum(1 / (rrf_k + rank)) over the lists it appears in; ``_score`` is
+        replaced by that sum scaled so a chunk ranked first in both lists gets 1.0.
+        Without keyword hits the dense results are returned unchanged.
+        """
+        if not keyword_results:
+            return dense_results
+        k = self.settings.rrf_k
+        chunks, scores = {}, {}
+        for results in (dense_results, keyword_results):
+            for rank, result in enumerate(results, 1):
+                key = result.get("_id")
+                chunks.setdefault(key, result)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+        best = 2.0 / (k + 1)
+        fused = []
+        for key in sorted(scores, key=scores.get, reverse=True):
+            result = dict(chunks[key])
+            result["_score"] = scores[key] / best
+            fused.append(result)
+        return fused
+
+    def _search(self, query: str, query_embedding: List[float], top_k: int) -> List[Dict]:
+        dense_results = self.store.query(vector=query_embedding, top_k=top_k * 2)
+        results = self._fuse(dense_results, self._keyword_results(query))
+        if self.reranker is None:
+            return results
+        return self.reranker.rerank(query, results, limit=self.settings.rerank_candidates)
+
+    def _retrieve(self, query: str, query_embedding: List[float], top_k: int) -> List[Tuple[float, str, str, str, int]]:
+        raw_results = self._search(query, query_embedding, top_k)
+        return self._expand_neighbours(self._group_by_page(raw_results, top_k), raw_results)
+
+    def _expand_neighbours(self, results: List[Tuple[float, str, str, str, int]], raw_results: List[Dict]) -> List[Tuple[float, str, str, str, int]]:
+        """
+        Widen each result with the chunks around it, read from the page store's adjacency map.
+
+        Both sides share ``neighbour_token_budget`` per result (a side that runs out hands its share
+        to the other); the last neighbour on a side is cut at a word boundary to fit. A chunk is only
+        added once across all results, and never when another result already holds it.
+        """
+        budget = self.settings.neighbour_token_budget
+        if budget <= 0 or not results:
+            return results
+
+        spans = []
+        covered = set()
+        for _, book_id, chunk_id, _, page_number in results:
+            if chunk_id.startswith("combined_"):
+                chunks = [r for r in raw_results if r.get("book_id") == book_id and r.get("page_number") == page_number]
+            else:
+                chunks = [r for r in raw_results if r.get("_id") == chunk_id][:1]
+            keys = sorted((c.get("page_number", 0), c.get("chunk_order", 0)) for c in chunks)
+            covered.update((book_id, key) for key in keys)
+            spans.append((keys[0], keys[-1]) if keys else None)
+
+        expanded = []
+        for (score, book_id, chunk_id, text, page_number), span in zip(results, spans):
+            if span is None:
+                expanded.append((score, book_id, chunk_id, text, page_number))
+                continue
+            frontier = {"prev": span[0], "next": span[1]}
+            added = {"prev": [], "next": []}
+            remaining = budget
+            while remaining > 0 and frontier:
+                share = max(1, remaining // len(frontier))
+                for side in list(frontier):
+                    neighbour = self.page_store.neighbour(book_id, *frontier[side], side)
+                    key = (neighbour["page_number"], neighbour["chunk_order"]) if neighbour else None
+                    if neighbour is None or (book_id, key) in covered:
+                        del frontier[side]
+                        continue
+                    piece = neighbour["text"]
+                    cost = _estimate_tokens(piece)
+                    if cost > share:
+                        # Keep the part nearest the hit.
+                        limit = share * 4
+                        piece = piece[:limit].rsplit(" ", 1)[0] if side == "next" else piece[-limit:].split(" ", 1)[-1]
+                        cost = _estimate_tokens(piece)
+                        del frontier[side]
+                    else:
+                        frontier[side] = key
+                    covered.add((book_id, key))
+                    added[side].append(piece)
+                    remaining -= cost
+            parts = list(reversed(added["prev"])) + [text] + added["next"]
+            expanded.append((score, book_id, chunk_id, " ".join(p for p in parts if p.strip()), page_number))
+        return expanded
+
+    @staticmethod
+    def _group_by_page(raw_results: List[Dict], top_k: int) -> List[Tuple[float, str, str, str, int]]:
+        """Merge chunks that landed on the same page and keep the top_k results by score."""
+        page_groups = {}
+        for result in raw_results:
+            page_num = result.get("page_number", 0)
+            book_id = result.get("book_id", "unknown")
+            key = f"{book_id}_{page_num}"
+            
+            if key not in page_groups:
+                page_groups[key] = []
+            page_groups[key].append(result)
+        
+        processed_results = []
+        for key, chunks in page_groups.items():
+            sorted_chunks = sorted(chunks, key=lambda x: x.get("chunk_order", 0))
+            
+            if len(sorted_chunks) > 1 and len(processed_results) < top_k:
+                combined_text = " ".join([chunk.get("text", "") for chunk in sorted_chunks])
+                max_similarity = max([chunk.get("_score", 0.0) for chunk in sorted_chunks])
+                
+                processed_results.append((
+                    max_similarity,
+                    sorted_chunks[0].get("book_id", "unknown"),
+                    f"combined_{key}",
+                    combined_text,
+                    sorted_chunks[0].get("page_number", 0)
+                ))
+            else:
+                for chunk in sorted_chunks[:1]:  
+                    if len(processed_results) < top_k:
+                        processed_results.append((
+                            chunk.get("_score", 0.0),
+                            chunk.get("book_id", "unknown"),
+                            chunk.get("_id", "unknown"),
+                            chunk.get("text", ""),
+                            chunk.get("page_number", 0)
+                        ))
+        
+        processed_results.sort(key=lambda x: x[0], reverse=True)
+        return processed_results[:top_k]
 
     def retrieve_context_for_llm(self, query: str, top_k: int = 3) -> str:
         """
@@ -116,3 +432,14 @@ class Retriever:
         qvec = self.embed(query)
         results = self.store.query(vector=qvec, top_k=top_k, filter=filter)
         return results
+
+    def warmup(self, text: str = "warmup query") -> None:
+        """
+        Pay one-off startup costs before real traffic: a dummy encode on the embedding
+        executor (the thread async requests use) and one vector query to open the index connection.
+        Bypasses the embedding cache so hit/miss stats only count real queries.
+        """
+        embedding = self.embed_executor.submit(self.model.encode, [text]).result().tolist()[0]
+        self.store.query(vector=embedding, top_k=1)
+        if self.reranker is not None:
+            self.reranker.warmup(self.settings.rerank_candidates)
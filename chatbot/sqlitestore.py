@@ -0,0 +1,49 @@
+"""
+This module provides the per-thread SQLite connection handling shared by the SQLite-backed stores.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Tuple
+
+class SqliteStore:
+    """Base class of the stores kept in one SQLite file shared by threads and processes.
+
+    - sqlite3 connections can't be shared across threads, so each thread opens its own on first use
+    - every connection runs in WAL mode, so readers don't block the writer (other uvicorn or
+      ingest workers included)
+    - subclasses set ``SCHEMA`` (run once by __init__, so IF NOT EXISTS statements) and, when they
+      need them, extra ``CONNECT_KWARGS`` for sqlite3.connect, ``PRAGMAS`` and a ``ROW_FACTORY``
+    """
+    SCHEMA = ""
+    CONNECT_KWARGS: Dict[str, Any] = {}
+    PRAGMAS: Tuple[str, ...] = ()
+    ROW_FACTORY = None
+
+    def __init__(self, path: str):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, **self.CONNECT_KWARGS)
+            conn.execute("PRAGMA journal_mode=WAL")
+            for pragma in self.PRAGMAS:
+                conn.execute(f"PRAGMA {pragma}")
+            if self.ROW_FACTORY is not None:
+                conn.row_factory = self.ROW_FACTORY
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection; the thread's next call opens a new one."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,67 @@
+"""
+This module provides a SQLite registry of the tables detected at ingest time, keyed by table ID.
+"""
+
+import json
+from typing import Dict, Iterable, List
+from chatbot.sqlitestore import SqliteStore
+
+class TableRegistry(SqliteStore):
+    """Table ID -> complete formatted table, written at ingest time.
+
+    - rows are keyed by (table_id, book_id, page_number), so resolving "Table 1.2.1" is one index lookup
+    - a table continued across pages is stored as one row per page and returned in page order
+    - records come from extraction.find_page_tables: {table_id, bbox, text}
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tables (
+            table_id TEXT NOT NULL,
+            book_id TEXT NOT NULL,
+            page_number INTEGER NOT NULL,
+            bbox TEXT NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (table_id, book_id, page_number)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS tables_page ON tables (book_id, page_number);
+    """
+
+    def put_page_tables(self, book_id: str, page_number: int, tables: Iterable[Dict]):
+        """Replace the tables recorded for a page."""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM tables WHERE book_id = ? AND page_number = ?", (book_id, page_number))
+            conn.executemany(
+                "INSERT OR REPLACE INTO tables (table_id, book_id, page_number, bbox, text) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (table['table_id'], book_id, page_number, json.dumps(table['bbox']), table['text'])
+                    for table in tables
+                ],
+            )
+
+    def lookup(self, table_id: str) -> List[Dict]:
+        """Every part of the table with this ID, across books, in (book_id, page_number) order."""
+        cur = self._conn().execute(
+            "SELECT book_id, page_number, bbox, text FROM tables WHERE table_id = ? ORDER BY book_id, page_number",
+            (table_id,),
+        )
+        return [
+            {
+                'table_id': table_id,
+                'book_id': book_id,
+                'page_number': page_number,
+                'bbox': json.loads(bbox),
+                'text': text,
+            }
+            for book_id, page_number, bbox, text in cur.fetchall()
+        ]
+
+    def has_book(self, book_id: str) -> bool:
+        cur = self._conn().execute("SELECT 1 FROM tables WHERE book_id = ? LIMIT 1", (book_id,))
+        return cur.fetchone() is not None
+
+    def delete_page(self, book_id: str, page_number: int):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM tables WHERE book_id = ? AND page_number = ?", (book_id, page_number))
+
+    def delete_book(self, book_id: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM tables WHERE book_id = ?", (book_id,))
@@ -1,24 +1,200 @@
-from typing import List, Dict, Any
-from pinecone import Pinecone
+import json
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional
+import numpy as np
 from chatbot.config import Settings
+from chatbot.ratelimit import retry_with_backoff
+
+# Pinecone rejects upsert requests over 4 MB or 1000 vectors; stay a little under the byte limit.
+MAX_UPSERT_BYTES = 4 * 1024 * 1024
+MAX_UPSERT_VECTORS = 1000
+# Pinecone deletes at most 1000 IDs per request.
+MAX_DELETE_IDS = 1000
+
+def _vector_bytes(vector: Any) -> int:
+    if isinstance(vector, dict):
+        vector = (vector["id"], vector["values"], vector.get("metadata"))
+    return len(json.dumps(vector, ensure_ascii=False).encode("utf-8"))
+
+def size_batches(vectors: List[Any], max_bytes: int = MAX_UPSERT_BYTES, max_count: int = MAX_UPSERT_VECTORS) -> Iterator[List[Any]]:
+    """Group vectors into batches under a request-size budget instead of a fixed count."""
+    batch, size = [], 0
+    for vector in vectors:
+        n = _vector_bytes(vector)
+        if batch and (size + n > max_bytes or len(batch) >= max_count):
+            yield batch
+            batch, size = [], 0
+        batch.append(vector)
+        size += n
+    if batch:
+        yield batch
+
+def _is_transient(error: BaseException) -> bool:
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    # Client errors other than rate limiting won't succeed on retry.
+    return not (isinstance(status, int) and 400 <= status < 500 and status != 429)
+
+class StreamingUpserter:
+    """Upserts vectors fed in over time (e.g. one embedding micro-batch at a time) on one pool.
+
+    Fed vectors are packed into batches under ``max_batch_bytes`` (None: count only) and
+    ``max_count``; each full batch
+    is sent as ``upsert(vectors=batch)`` on the shared pool and retried with jittered backoff.
+    ``add`` blocks while ``max_in_flight`` batches are outstanding, so a fast producer can't
+    queue the whole document in memory. ``close`` sends the last partial batch, waits, prints the
+    throughput once and raises RuntimeError if any batch still failed after ``max_retries``.
+    """
+    def __init__(self, upsert, max_workers: int = 4, max_batch_bytes: Optional[int] = int(MAX_UPSERT_BYTES * 0.9),
+                 max_retries: int = 5, max_in_flight: Optional[int] = None, max_count: int = MAX_UPSERT_VECTORS):
+        self.upsert = upsert
+        self.max_batch_bytes = max_batch_bytes
+        self.max_count = max_count
+        self.max_retries = max_retries
+        max_workers = max(1, max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max(1, max_in_flight or max_workers * 2))
+        self._lock = threading.Lock()
+        self._batch: List[Any] = []
+        self._batch_bytes = 0
+        self._sent = 0
+        self._done = 0
+        self._failed: List[tuple] = []
+        self._start = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # The caller is bailing out: drop queued batches instead of sending them.
+            self._pool.shutdown(wait=True, cancel_futures=True)
+        return False
+
+    def add(self, vectors: List[Any]):
+        for vector in vectors:
+            n = 0 if self.max_batch_bytes is None else _vector_bytes(vector)
+            if self._batch and (
+                len(self._batch) >= self.max_count
+                or (self.max_batch_bytes is not None and self._batch_bytes + n > self.max_batch_bytes)
+            ):
+                self._submit()
+            self._batch.append(vector)
+            self._batch_bytes += n
+
+    def _submit(self):
+        batch, self._batch, self._batch_bytes = self._batch, [], 0
+        self._sent += 1
+        i = self._sent
+        self._slots.acquire()
+        if self._start is None:
+            self._start = time.monotonic()
+
+        def send() -> int:
+            retry_with_backoff(
+                lambda: self.upsert(vectors=batch),
+                retry_on=(Exception,),
+                max_retries=self.max_retries,
+                retry_if=_is_transient,
+                on_retry=lambda e, attempt, delay: print(
+                    f"Upsert batch {i} failed ({e}); retry {attempt}/{self.max_retries} in {delay:.1f}s"
+                ),
+            )
+            return len(batch)
+
+        def finished(future):
+            self._slots.release()
+            if future.cancelled():
+                return
+            with self._lock:
+                try:
+                    self._done += future.result()
+                except Exception as e:
+                    self._failed.append((i, e))
+
+        self._pool.submit(send).add_done_callback(finished)
+
+    def close(self) -> Dict[str, float]:
+        """Send what is left, wait for every batch and return throughput stats."""
+        if self._batch:
+            self._submit()
+        self._pool.shutdown(wait=True)
+        if not self._sent:
+            return {"vectors": 0, "batches": 0, "seconds": 0.0, "vectors_per_second": 0.0}
+        elapsed = time.monotonic() - self._start
+        rate = self._done / elapsed if elapsed > 0 else float(self._done)
+        print(f"Upserted {self._done} vectors in {self._sent} batches, {elapsed:.2f}s ({rate:.0f} vectors/s)")
+        if self._failed:
+            raise RuntimeError(
+                f"{len(self._failed)}/{self._sent} upsert batches failed; first error: {self._failed[0][1]}"
+            )
+        return {"vectors": self._done, "batches": self._sent, "seconds": elapsed, "vectors_per_second": rate}
+
+def parallel_upsert(upsert, vectors: List[Any], max_workers: int = 4,
+                    max_batch_bytes: int = int(MAX_UPSERT_BYTES * 0.9),
+                    max_retries: int = 5) -> Dict[str, float]:
+    """Upsert size-bounded batches concurrently, retrying each batch with jittered backoff.
+
+    ``upsert`` is called as ``upsert(vectors=batch)``. Batches that still fail after
+    ``max_retries`` retries don't stop the others; a RuntimeError is raised at the end.
+    Returns throughput stats.
+    """
+    with StreamingUpserter(upsert, max_workers=max_workers, max_batch_bytes=max_batch_bytes,
+                           max_retries=max_retries) as upserter:
+        upserter.add(vectors)
+        return upserter.close()
+
+def batch_delete(delete, ids: List[str], batch_size: int = MAX_DELETE_IDS, max_retries: int = 5) -> int:
+    """Delete IDs in requests of at most ``batch_size``, retrying each with jittered backoff.
+
+    ``delete`` is called as ``delete(ids=batch)``. The error of a batch that still fails after
+    ``max_retries`` retries is re-raised. Returns the number of IDs deleted.
+    """
+    batches = [ids[i : i + batch_size] for i in range(0, len(ids), batch_size)]
+    for i, batch in enumerate(batches):
+        retry_with_backoff(
+            lambda: delete(ids=batch),
+            retry_on=(Exception,),
+            max_retries=max_retries,
+            retry_if=_is_transient,
+            on_retry=lambda e, attempt, delay: print(
+                f"Delete batch {i + 1}/{len(batches)} failed ({e}); retry {attempt}/{max_retries} in {delay:.1f}s"
+            ),
+        )
+    return len(ids)
+
 
 class PineconeStore:
     def __init__(self, settings: Settings):
         self.settings = settings
+        from pinecone import Pinecone
+
         self.pc = Pinecone(api_key=self.settings.pinecone_api_key)
         self.index = self.pc.Index(self.settings.pinecone_index)
 
     def batch_upsert(self, to_upsert: List[tuple], batch_size: int = 100):
-        """Splits the data into smaller batches to avoid Pinecone's 4MB limit."""
-        for i in range(0, len(to_upsert), batch_size):
-            batch = to_upsert[i : i + batch_size]
-            self.index.upsert(vectors=batch)
-            print(f"Upserted batch {i//batch_size + 1}/{(len(to_upsert) // batch_size) + 1}")
+        """Upserts concurrently in batches sized to stay under Pinecone's 4MB request limit.
+
+        ``batch_size`` is kept for compatibility; batches are now bounded by bytes.
+        """
+        return parallel_upsert(
+            self.index.upsert,
+            to_upsert,
+            max_workers=self.settings.upsert_workers,
+            max_batch_bytes=self.settings.upsert_max_batch_bytes,
+            max_retries=self.settings.upsert_max_retries,
+        )
 
     def upsert(self, vectors: List[Dict[str, Any]]):
         # vectors: [{id, values, metadata}]
         self.index.upsert(vectors=vectors)
 
+    def delete(self, ids: List[str], batch_size: int = MAX_DELETE_IDS):
+        batch_delete(self.index.delete, ids, batch_size=batch_size, max_retries=self.settings.upsert_max_retries)
+
     def query(self, vector: List[float], top_k: int = 5, filter: Dict = None) -> List[Dict[str, Any]]:
         res = self.index.query(
             vector=vector, 
@@ -54,3 +230,474 @@ class PineconeStore:
         except Exception as e:
             print(f"Error querying Pinecone: {e}")
             return []
+
+
+_MISSING = -1
+# Rows of a compact (float16/int8) index widened to float32 per matrix-vector product.
+_SCORE_BLOCK = 4096
+
+
+class _Absent:
+    """Marks a dense-column row that has no value for the field (distinct from None)."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<absent>"
+
+
+_ABSENT = _Absent()
+
+
+class MetadataColumns:
+    """Per-field columns instead of one dict per row.
+
+    - "text" (unique per chunk) is a plain list
+    - every other field is categorical: an int32 code per row (-1 = key absent) into a small
+      table of distinct values, so book ids, page numbers and flags cost 4 bytes per row
+    """
+    DENSE_FIELDS = ("text",)
+
+    def __init__(self):
+        self._dense: Dict[str, List[Any]] = {}
+        self._codes: Dict[str, array] = {}
+        self._values: Dict[str, List[Any]] = {}
+        self._lookup: Dict[str, Dict[Any, int]] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _add_field(self, field: str):
+        if field in self.DENSE_FIELDS:
+            self._dense[field] = [_ABSENT] * self._size
+        else:
+            self._codes[field] = array("i", [_MISSING]) * self._size
+            self._values[field] = []
+            self._lookup[field] = {}
+
+    def _encode(self, field: str, value: Any) -> int:
+        # Keyed by type too, so True and 1 (equal and same hash) keep distinct codes.
+        key = (type(value), value)
+        code = self._lookup[field].get(key)
+        if code is None:
+            code = len(self._values[field])
+            self._values[field].append(value)
+            self._lookup[field][key] = code
+        return code
+
+    def _to_dense(self, field: str):
+        values = self._values[field]
+        self._dense[field] = [values[c] if c != _MISSING else _ABSENT for c in self._codes[field]]
+        del self._codes[field], self._values[field], self._lookup[field]
+
+    def _set_field(self, pos: int, field: str, value: Any):
+        if field not in self._dense and field not in self._codes:
+            self._add_field(field)
+        if field in self._codes:
+            try:
+                self._codes[field][pos] = self._encode(field, value)
+                return
+            except TypeError:
+                # Unhashable values (e.g. lists) can't be categorical.
+                self._to_dense(field)
+        self._dense[field][pos] = value
+
+    def set(self, pos: int, metadata: Dict[str, Any]):
+        """Replace the metadata of row ``pos``; ``pos == len(self)`` appends a row."""
+        if pos == self._size:
+            self._size += 1
+            for column in self._dense.values():
+                column.append(_ABSENT)
+            for codes in self._codes.values():
+                codes.append(_MISSING)
+        else:
+            for column in self._dense.values():
+                column[pos] = _ABSENT
+            for codes in self._codes.values():
+                codes[pos] = _MISSING
+        for field, value in metadata.items():
+            self._set_field(pos, field, value)
+
+    def get(self, pos: int) -> Dict[str, Any]:
+        md = {}
+        for field, column in self._dense.items():
+            if column[pos] is not _ABSENT:
+                md[field] = column[pos]
+        for field, codes in self._codes.items():
+            if codes[pos] != _MISSING:
+                md[field] = self._values[field][codes[pos]]
+        return md
+
+    def take(self, keep: List[int]):
+        for field, column in self._dense.items():
+            self._dense[field] = [column[i] for i in keep]
+        for field, codes in self._codes.items():
+            self._codes[field] = array("i", (codes[i] for i in keep))
+        self._size = len(keep)
+
+    @staticmethod
+    def _accepts(value: Any, cond: Any) -> bool:
+        if isinstance(cond, dict):
+            for op, expected in cond.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+            return True
+        return value == cond
+
+    def mask(self, filter: Dict) -> np.ndarray:
+        """Boolean row mask for a Pinecone-style filter ($eq, $in or plain equality; absent = None)."""
+        mask = np.ones(self._size, dtype=bool)
+        for field, cond in filter.items():
+            if field in self._codes:
+                # Decide per distinct value once, then select rows by code.
+                codes = np.frombuffer(self._codes[field], dtype=np.int32)
+                accepted = [c for c, v in enumerate(self._values[field]) if self._accepts(v, cond)]
+                if self._accepts(None, cond):
+                    accepted.append(_MISSING)
+                mask &= np.isin(codes, accepted)
+            elif field in self._dense:
+                column = self._dense[field]
+                mask &= np.fromiter(
+                    (self._accepts(None if v is _ABSENT else v, cond) for v in column),
+                    dtype=bool, count=self._size,
+                )
+            elif not self._accepts(None, cond):
+                mask[:] = False
+        return mask
+
+    def to_json(self) -> Dict[str, Any]:
+        dense = {
+            field: {
+                "values": [None if v is _ABSENT else v for v in column],
+                "absent": [i for i, v in enumerate(column) if v is _ABSENT],
+            }
+            for field, column in self._dense.items()
+        }
+        categorical = {
+            field: {"values": self._values[field], "codes": codes.tolist()}
+            for field, codes in self._codes.items()
+        }
+        return {"dense": dense, "categorical": categorical}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any], size: int) -> "MetadataColumns":
+        columns = cls()
+        columns._size = size
+        for field, col in data.get("dense", {}).items():
+            values = list(col["values"])
+            for i in col["absent"]:
+                values[i] = _ABSENT
+            columns._dense[field] = values
+        for field, col in data.get("categorical", {}).items():
+            columns._codes[field] = array("i", col["codes"])
+            columns._values[field] = list(col["values"])
+            columns._lookup[field] = {(type(v), v): c for c, v in enumerate(col["values"])}
+        return columns
+
+
+class LocalVectorStore:
+    """In-process vector index with the same interface as PineconeStore.
+
+    - rows are L2-normalised on insert, so one matrix-vector product gives cosine scores
+    - vectors are stored as ``settings.local_index_dtype``: float32, float16, or int8 codes
+      with a per-vector float32 scale (row ~= codes * scale)
+    - metadata is held column-wise (MetadataColumns) rather than as a dict per row
+    - persisted to ``settings.local_index_dir`` as ``vectors.npy`` (+ ``scales.npy``) + ``meta.json``
+    - queries reload the files when another process (ingest) has saved them since they were loaded;
+      ``meta.json`` is swapped in last by save(), so its mtime marks a complete write
+    """
+    DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.dim = settings.embedding_dim
+        self.base_dir = settings.local_index_dir
+        self.dtype = settings.local_index_dtype if settings.local_index_dtype in self.DTYPES else "float32"
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((0, self.dim), dtype=self.DTYPES[self.dtype])
+        self._scales = np.zeros(0, dtype=np.float32) if self.dtype == "int8" else None
+        self._size = 0
+        self._ids: List[str] = []
+        self._metadata = MetadataColumns()
+        self._positions: Dict[str, int] = {}
+        self._loaded_signature = None
+        self._dirty = False
+        self._reload_lock = threading.Lock()
+        self.load()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.base_dir, "vectors.npy")
+
+    @property
+    def _scales_path(self) -> str:
+        return os.path.join(self.base_dir, "scales.npy")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.base_dir, "meta.json")
+
+    def __len__(self) -> int:
+        return self._size
+
+    def nbytes(self) -> int:
+        """Bytes held by the vector matrix (and int8 scales), including spare capacity."""
+        return self._vectors.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+
+    @staticmethod
+    def _file_signature(path: str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+    def _signature(self):
+        return self._file_signature(self._meta_path)
+
+    def _files_match(self, meta: Dict[str, Any]) -> bool:
+        """Whether the array files on disk are the ones this meta.json was saved with."""
+        files = meta.get("files")
+        if files is None:
+            # Written before saves recorded their files.
+            return True
+        paths = {"vectors": self._vectors_path, "scales": self._scales_path}
+        return all(self._file_signature(paths[name]) == signature for name, signature in files.items())
+
+    def load(self):
+        signature = self._signature()
+        if signature is None or not os.path.exists(self._vectors_path):
+            return
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if not self._files_match(meta):
+            # Between the file swaps of a concurrent save; the next refresh() picks it up.
+            return
+        vectors = np.load(self._vectors_path)
+        stored_dtype = meta.get("dtype", "float32")
+        scales = np.load(self._scales_path).astype(np.float32) if stored_dtype == "int8" else None
+        if not self._files_match(meta):
+            return
+        size = len(meta["ids"])
+        if "columns" in meta:
+            metadata = MetadataColumns.from_json(meta["columns"], size)
+        else:
+            # Index written before metadata was columnar: one dict per row.
+            metadata = MetadataColumns()
+            for pos, md in enumerate(meta["metadata"]):
+                metadata.set(pos, md)
+        if stored_dtype != self.dtype:
+            # LOCAL_INDEX_DTYPE changed since the index was written: re-encode once on load.
+            if scales is not None:
+                vectors = vectors.astype(np.float32) * scales[:, None]
+            vectors, scales = self._quantize(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            self._vectors = np.ascontiguousarray(vectors)
+            self._scales = scales
+            self._size = size
+            self._ids = list(meta["ids"])
+            self._metadata = metadata
+            self._positions = {vid: i for i, vid in enumerate(self._ids)}
+            self._loaded_signature = signature
+            self._dirty = False
+
+    def refresh(self) -> bool:
+        """Reload if the files changed since they were loaded (unless there are unsaved changes here)."""
+        if self._dirty or self._signature() == self._loaded_signature:
+            return False
+        # One reloading thread is enough; the others keep querying the current data meanwhile.
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            if self._signature() == self._loaded_signature:
+                return False
+            self.load()
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def save(self):
+        """Persist the index; files are written to a temp name and swapped in."""
+        os.makedirs(self.base_dir, exist_ok=True)
+        with self._lock:
+            tmp_vectors = self._vectors_path + ".tmp.npy"
+            tmp_scales = self._scales_path + ".tmp.npy"
+            tmp_meta = self._meta_path + ".tmp"
+            np.save(tmp_vectors, self._vectors[: self._size])
+            # A rename keeps inode and mtime, so readers can tell which arrays this meta.json goes with.
+            files = {"vectors": self._file_signature(tmp_vectors)}
+            if self._scales is not None:
+                np.save(tmp_scales, self._scales[: self._size])
+                files["scales"] = self._file_signature(tmp_scales)
+            meta = {"dtype": self.dtype, "ids": self._ids, "columns": self._metadata.to_json(), "files": files}
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_vectors, self._vectors_path)
+            if self._scales is not None:
+                os.replace(tmp_scales, self._scales_path)
+            os.replace(tmp_meta, self._meta_path)
+            self._loaded_signature = self._signature()
+            self._dirty = False
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= self._vectors.shape[0]:
+            return
+        capacity = max(needed, 2 * self._vectors.shape[0], 1024)
+        grown = np.zeros((capacity, self.dim), dtype=self._vectors.dtype)
+        grown[: self._size] = self._vectors[: self._size]
+        self._vectors = grown
+        if self._scales is not None:
+            scales = np.zeros(capacity, dtype=np.float32)
+            scales[: self._size] = self._scales[: self._size]
+            self._scales = scales
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _quantize(self, matrix: np.ndarray):
+        """Encode float32 rows in the store's dtype; returns (rows, scales or None)."""
+        if self.dtype != "int8":
+            return matrix.astype(self.DTYPES[self.dtype]), None
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _add(self, vectors: List[Any]):
+        # Accepts Pinecone-style (id, values, metadata) tuples or {id, values, metadata} dicts.
+        items = []
+        for v in vectors:
+            if isinstance(v, dict):
+                items.append((v["id"], v["values"], v.get("metadata") or {}))
+            else:
+                items.append((v[0], v[1], v[2] if len(v) > 2 else {}))
+        if not items:
+            return
+        rows, scales = self._quantize(
+            self._normalize(np.asarray([values for _, values, _ in items], dtype=np.float32))
+        )
+        with self._lock:
+            self._dirty = True
+            self._reserve(len(items))
+            for i, (vid, _, metadata) in enumerate(items):
+                pos = self._positions.get(vid)
+                if pos is None:
+                    pos = self._size
+                    self._size += 1
+                    self._ids.append(vid)
+                    self._positions[vid] = pos
+                self._metadata.set(pos, metadata)
+                self._vectors[pos] = rows[i]
+                if scales is not None:
+                    self._scales[pos] = scales[i]
+
+    def batch_upsert(self, to_upsert: List[tuple], batch_size: int = 100, save: bool = True):
+        """Add vectors; ``save=False`` leaves persisting to the caller (one save() per ingested file
+        instead of rewriting the whole index for every micro-batch)."""
+        for i in range(0, len(to_upsert), batch_size):
+            self._add(to_upsert[i : i + batch_size])
+            print(f"Upserted batch {i//batch_size + 1}/{(len(to_upsert) // batch_size) + 1}")
+        if save:
+            self.save()
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        self._add(vectors)
+        self.save()
+
+    def _remove(self, ids: List[str]):
+        with self._lock:
+            drop = {self._positions[vid] for vid in ids if vid in self._positions}
+            if not drop:
+                return
+            self._dirty = True
+            keep = [i for i in range(self._size) if i not in drop]
+            self._vectors = np.ascontiguousarray(self._vectors[keep])
+            if self._scales is not None:
+                self._scales = self._scales[keep]
+            self._ids = [self._ids[i] for i in keep]
+            self._metadata.take(keep)
+            self._size = len(keep)
+            self._positions = {vid: i for i, vid in enumerate(self._ids)}
+
+    def delete(self, ids: List[str], batch_size: int = 1000, save: bool = True):
+        self._remove(ids)
+        if save:
+            self.save()
+
+    def ids(self, filter: Dict = None) -> List[str]:
+        """IDs of the vectors matching a Pinecone-style filter (every vector without one)."""
+        self.refresh()
+        with self._lock:
+            return [self._ids[int(p)] for p in self._filter_positions(filter)]
+
+    def _filter_positions(self, filter: Dict = None) -> np.ndarray:
+        if not filter:
+            return np.arange(self._size)
+        return np.flatnonzero(self._metadata.mask(filter))
+
+    def _scores(self, q: np.ndarray, positions: np.ndarray = None) -> np.ndarray:
+        n = self._size if positions is None else len(positions)
+        scores = np.empty(n, dtype=np.float32)
+        if self._vectors.dtype == np.float32:
+            rows = self._vectors[: self._size] if positions is None else self._vectors[positions]
+            return np.dot(rows, q, out=scores)
+        # Widen compact rows into a small reused float32 buffer so BLAS does the products.
+        buffer = np.empty((min(n, _SCORE_BLOCK), self.dim), dtype=np.float32)
+        for start in range(0, n, _SCORE_BLOCK):
+            stop = min(n, start + _SCORE_BLOCK)
+            rows = slice(start, stop) if positions is None else positions[start:stop]
+            block = buffer[: stop - start]
+            np.copyto(block, self._vectors[rows], casting="unsafe")
+            np.dot(block, q, out=scores[start:stop])
+            if self._scales is not None:
+                scores[start:stop] *= self._scales[rows]
+        return scores
+
+    def query(self, vector: List[float], top_k: int = 5, filter: Dict = None) -> List[Dict[str, Any]]:
+        self.refresh()
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        with self._lock:
+            candidates = self._filter_positions(filter)
+            if top_k <= 0 or len(candidates) == 0:
+                return []
+            scores = self._scores(q, candidates if filter else None)
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            out = []
+            for i in top:
+                pos = int(candidates[i])
+                md = self._metadata.get(pos)
+                md["_score"] = float(scores[i])
+                md["_id"] = self._ids[pos]
+                out.append(md)
+            return out
+
+    def query_page(self, book_id: str, page_number: int, embedding_dim: int = 384) -> List[str]:
+        """Query all text chunks from a specific book and page number."""
+        self.refresh()
+        filter_dict = {
+            'book_id': {'$eq': book_id},
+            'page_number': {'$eq': page_number}
+        }
+        with self._lock:
+            positions = self._filter_positions(filter_dict)
+            chunks = [self._metadata.get(int(p)) for p in positions]
+        chunks.sort(key=lambda md: md.get('chunk_order', 0))
+        return [md.get('text', '') for md in chunks]
+
+
+def create_vector_store(settings: Settings):
+    """Return the vector store selected by ``settings.vector_backend``."""
+    if settings.vector_backend == "local":
+        return LocalVectorStore(settings=settings)
+    return PineconeStore(settings=settings)
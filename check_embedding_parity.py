@@ -0,0 +1,89 @@
+"""
+Parity check for the ONNX embedding backends against the sentence-transformers (torch) model.
+
+Embeds a set of sample texts (plus chunks from the page store, if ingested) with each backend
+and compares them to the torch output by cosine similarity. Exits non-zero if any text falls
+below the threshold of its backend.
+
+Usage: python check_embedding_parity.py [--export] [--model NAME] [--model-dir DIR]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from chatbot.config import Settings
+from chatbot.embeddings import ONNX_FILE, ONNX_INT8_FILE, OnnxEmbedder, export_onnx_model
+
+MIN_COSINE = {"onnx": 0.9999, "onnx-int8": 0.98}
+
+SAMPLE_TEXTS = [
+    "What are the short term financial objectives?",
+    "Short Term Financial Objectives Table 1.2.1",
+    "How is the annual budget approved and who signs off on capital expenditure?",
+    "Procurement above the threshold requires three written quotations.",
+    "travel   ALLOWANCES for staff on official duty",
+    "The organisation maintains a minimum cash reserve equivalent to three months of operating costs.",
+    "Revenue:\n- Grants\n- Donations\n- Investment income",
+    "x",
+]
+
+def load_texts(page_store_path, limit=200):
+    texts = list(SAMPLE_TEXTS)
+    if os.path.exists(page_store_path):
+        conn = sqlite3.connect(page_store_path)
+        try:
+            rows = conn.execute("SELECT text FROM chunks LIMIT ?", (limit,)).fetchall()
+            texts.extend(row[0] for row in rows if row[0])
+        except sqlite3.Error as e:
+            print(f"Skipping page store chunks: {e}")
+        finally:
+            conn.close()
+    return texts
+
+def timed_encode(model, texts):
+    start = time.perf_counter()
+    embeddings = np.asarray(model.encode(texts), dtype=np.float32)
+    return embeddings, time.perf_counter() - start
+
+def main():
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Compare ONNX embeddings with the torch model")
+    parser.add_argument("--model", default=settings.embedding_model_name)
+    parser.add_argument("--model-dir", default=settings.onnx_model_dir)
+    parser.add_argument("--export", action="store_true", help="(Re)export the ONNX files first")
+    args = parser.parse_args()
+
+    if args.export or not os.path.exists(os.path.join(args.model_dir, ONNX_FILE)):
+        export_onnx_model(args.model, args.model_dir)
+
+    texts = load_texts(settings.page_store_path)
+    reference, torch_s = timed_encode(SentenceTransformer(args.model), texts)
+    print(f"{len(texts)} texts | torch: {torch_s * 1000 / len(texts):.2f} ms/text")
+
+    ok = True
+    for backend, filename in (("onnx", ONNX_FILE), ("onnx-int8", ONNX_INT8_FILE)):
+        if not os.path.exists(os.path.join(args.model_dir, filename)):
+            print(f"{backend}: {filename} missing, skipped")
+            continue
+        embedder = OnnxEmbedder(args.model_dir, quantized=backend == "onnx-int8")
+        embeddings, seconds = timed_encode(embedder, texts)
+        # Both sides are L2-normalised, so the row-wise dot product is the cosine similarity.
+        cosines = np.sum(embeddings * reference, axis=1)
+        passed = bool(cosines.min() >= MIN_COSINE[backend])
+        ok = ok and passed
+        print(
+            f"{backend}: {seconds * 1000 / len(texts):.2f} ms/text | cosine min {cosines.min():.6f}"
+            f" mean {cosines.mean():.6f} | threshold {MIN_COSINE[backend]} | {'PASS' if passed else 'FAIL'}"
+        )
+        if not passed:
+            worst = int(np.argmin(cosines))
+            print(f"  worst text: {texts[worst][:80]!r}")
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
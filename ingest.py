@@ -1,111 +1,127 @@
+import argparse
+import hashlib
+import json
 import os
-import time
-from uuid import uuid4
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import pdfplumber
-import pandas as pd
-from pdfplumber.utils import extract_text, get_bbox_overlap, obj_to_bbox
-from groq import Groq
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from chatbot.cache import bump_index_version
+from chatbot.config import Settings
+from chatbot.embeddings import create_embedder
+from chatbot.extraction import iter_pdf_pages, process_pdf_with_tables
+from chatbot.formatcache import FormattedPageCache
+from chatbot.jobqueue import JobQueue
+from chatbot.keywordindex import KeywordIndex
+from chatbot.pagestore import PageStore
+from chatbot.ratelimit import TokenBucket, retry_with_backoff
+from chatbot.tableregistry import TableRegistry
+from chatbot.vectorstore import LocalVectorStore, StreamingUpserter, batch_delete, parallel_upsert
 
 load_dotenv()
 
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
 
 data_folder = "./data"
 chunk_size = 1000
 chunk_overlap = 100
 check_interval = 10
+# Processes used for page extraction (1 = serial)
+extract_workers = int(os.getenv("EXTRACT_WORKERS", "1"))
+# Concurrent LLM page-formatting requests, client-side request rate and retries per page
+llm_max_in_flight = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+llm_requests_per_minute = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+llm_max_retries = int(os.getenv("LLM_MAX_RETRIES", "5"))
+# Daemon mode: files ingested in parallel and attempts per file before a job is marked failed
+ingest_file_workers = int(os.getenv("INGEST_FILE_WORKERS", "2"))
+ingest_max_attempts = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+# Streaming ingest: chunks per embedding micro-batch and items buffered between pipeline stages
+embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+pipeline_queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+# Persistent cache of LLM-formatted pages; bump format_prompt_version when the prompt changes
+format_cache_path = os.getenv("FORMAT_CACHE_PATH", "store/format_cache.db")
+format_model = "llama-3.3-70b-versatile"
+format_prompt_version = "1"
+# Per-document manifests of page hashes and vector IDs for incremental re-ingestion
+manifest_dir = os.getenv("MANIFEST_DIR", "store/manifests")
 pinecone_api_key = os.getenv("PINECONE_API_KEY")
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-pc = Pinecone(api_key=pinecone_api_key)
+settings = Settings()
 index_name = "finance-policy"
-index = pc.Index(index_name)
 
-# Process PDF files with table extraction. This is done using pdfplumber.
-def process_pdf_with_tables(pdf_path):
-    """Extract PDF content with proper table formatting using pdfplumber"""
+# Everything heavier than chatbot.extraction is built or imported on first use: spawned extraction
+# workers re-import this module as __mp_main__ and should only pay for what they run.
+def _lazy(build):
+    """A getter that builds its value on the first call (once, even across threads)."""
+    value = []
+    lock = threading.Lock()
+
+    def get():
+        if not value:
+            with lock:
+                if not value:
+                    value.append(build())
+        return value[0]
+    return get
+
+def _build_index():
+    if settings.vector_backend == "local":
+        # LocalVectorStore.upsert accepts the same (id, values, metadata) tuples as a Pinecone index.
+        return LocalVectorStore(settings)
+    from pinecone import Pinecone
+
+    pc = Pinecone(api_key=pinecone_api_key)
+    return pc.Index(index_name)
+
+def _build_groq_client():
+    from groq import Groq
+
+    # In document there can be tables which need to be reformatted because of their structure. So I use LLM to format them as descriptive text.
+    # One client for the whole run; retries are handled below so the SDK's own retries are disabled.
+    return Groq(api_key=groq_api_key, max_retries=0)
+
+get_model = _lazy(lambda: create_embedder(settings))
+get_index = _lazy(_build_index)
+# Raises (e.g. without GROQ_API_KEY) inside the formatting call, which fails just that page.
+get_groq_client = _lazy(_build_groq_client)
+get_page_store = _lazy(lambda: PageStore(settings.page_store_path))
+get_keyword_index = _lazy(lambda: KeywordIndex(settings.keyword_index_path))
+get_table_registry = _lazy(lambda: TableRegistry(settings.table_registry_path))
+get_format_cache = _lazy(lambda: FormattedPageCache(format_cache_path))
+
+# Shared pacing for every formatting call (requests per second, small burst allowance).
+llm_bucket = TokenBucket(rate=llm_requests_per_minute / 60.0, capacity=max(1, llm_max_in_flight))
+
+def _retry_after(error):
+    """Seconds from a 429 response's Retry-After header, if the server sent one."""
+    response = getattr(error, "response", None)
     try:
-        pdf = pdfplumber.open(pdf_path)
-        all_pages = []
-        
-        table_settings = {
-            "vertical_strategy": "lines_strict",
-            "horizontal_strategy": "lines_strict",
-            "snap_tolerance": 3,
-            "join_tolerance": 3,
-            "min_words_vertical": 1,
-            "min_words_horizontal": 1
-        }
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
 
-        for page in pdf.pages:
-            page_number = page.page_number
-            filtered_page = page
-            chars = filtered_page.chars
+def _on_llm_retry(error, attempt, delay):
+    from groq import RateLimitError
 
-            try:
-                for table in page.find_tables(table_settings=table_settings):
-                    try:
-                        first_table_char = page.crop(table.bbox).chars[0]
-                    except IndexError:
-                        first_table_char = {"x0": table.bbox[0], "y0": table.bbox[1], "text": ""}
-
-                    filtered_page = filtered_page.filter(
-                        lambda obj: get_bbox_overlap(obj_to_bbox(obj), table.bbox) is None
-                    )
-                    chars = filtered_page.chars
-                    # Create DataFrame from table data.
-                    df = pd.DataFrame(table.extract())
-                    if df.empty:
-                        continue
-
-                    headers = list(df.iloc[0])
-                    df = df.drop(0).reset_index(drop=True) if len(df) > 1 else df
-
-                    table_text = []
-                    for col_idx, header in enumerate(headers):
-                        if header is None or str(header).strip() == "":
-                            continue
-                        col_values = df[col_idx].dropna().tolist()
-                        section = f"{header.strip()}:\n" + "\n".join(
-                            f"- {str(val).strip()}" for val in col_values if str(val).strip()
-                        )
-                        table_text.append(section)
-
-                    formatted_table = "\n\n".join(table_text)
-                    chars.append(first_table_char | {"text": formatted_table})
-
-                page_text = extract_text(chars, layout=True)
-                all_pages.append({
-                    'page_number': page_number,
-                    'content': page_text
-                })
-                
-            except Exception as e:
-                print(f"Error processing page {page_number}: {str(e)}")
-                page_text = page.extract_text()
-                all_pages.append({
-                    'page_number': page_number,
-                    'content': page_text or ""
-                })
-
-        pdf.close()
-        return all_pages
-        
-    except Exception as e:
-        print(f"Error processing PDF: {str(e)}")
-        return []
+    if isinstance(error, RateLimitError):
+        # Slow every in-flight formatter down, not just the one that got the 429.
+        llm_bucket.penalize(delay)
+    print(f"LLM formatting retry {attempt}/{llm_max_retries} in {delay:.1f}s: {error}")
 
-# In document there can be tables which need to be reformatted because of their structure. So I use LLM to format them as descriptive text.
 def format_with_llm(extracted_text, page_number):
     """Format extracted text using LLM for better structure"""
-    try:
-        client = Groq(api_key=groq_api_key)
+    formatted = try_format_with_llm(extracted_text, page_number)
+    return extracted_text if formatted is None else formatted
 
-        prompt = f"""
+def try_format_with_llm(extracted_text, page_number):
+    """format_with_llm that returns None instead of the raw text when formatting fails."""
+    format_cache = get_format_cache()
+    cached = format_cache.get(extracted_text, page_number, format_model, format_prompt_version)
+    if cached is not None:
+        return cached
+
+    prompt = f"""
         You are provided with extracted text from page {page_number} of a financial policy PDF.\n
         Strictly dont change any content.\n
         Only utilize the tables and rewrite table as descriptive text instead of table formate.\n
@@ -118,8 +134,11 @@ def format_with_llm(extracted_text, page_number):
         Format this text for optimal readability and return the result.
         """
 
+    def complete():
+        client = get_groq_client()
+        llm_bucket.acquire()
         completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+            model=format_model,
             messages=[
                 {
                     "role": "user",
@@ -127,100 +146,450 @@ def format_with_llm(extracted_text, page_number):
                 }
             ],
         )
-
         return completion.choices[0].message.content
-        
+
+    try:
+        from groq import APIConnectionError, InternalServerError, RateLimitError
+
+        formatted = retry_with_backoff(
+            complete,
+            retry_on=(RateLimitError, APIConnectionError, InternalServerError),
+            max_retries=llm_max_retries,
+            on_retry=_on_llm_retry,
+            delay_hint=_retry_after,
+        )
     except Exception as e:
         print(f"Error formatting with LLM: {str(e)}")
-        return extracted_text  
+        return None
 
-# Batch upsert function: this is used to split the data into smaller batches for efficient upserting.
-def batch_upsert(index, to_upsert, batch_size=100):
-    """Splits the data into smaller batches to avoid Pinecone's 4MB limit."""
-    for i in range(0, len(to_upsert), batch_size):
-        batch = to_upsert[i : i + batch_size]
-        index.upsert(vectors=batch)
-        print(f"Upserted batch {i//batch_size + 1}/{(len(to_upsert) // batch_size) + 1}")
+    if not formatted:
+        return None
+    # Only successful completions are cached; pages that fell back to raw text are marked
+    # 'formatted': False in the manifest and retried next run.
+    format_cache.put(extracted_text, page_number, format_model, format_prompt_version, formatted)
+    return formatted
+
+def format_pages_stream(pages, max_in_flight=None):
+    """Format non-empty pages concurrently, at most max_in_flight requests at a time.
+
+    Consumes and yields lazily, in page order; a page whose formatting fails keeps its raw text
+    and has 'formatted': False.
+    """
+    def format_page(page_data):
+        print(f"Formatting page {page_data['page_number']} with LLM...")
+        formatted = try_format_with_llm(page_data['content'], page_data['page_number'])
+        return {
+            'page_number': page_data['page_number'],
+            'content': page_data['content'] if formatted is None else formatted,
+            'raw_content': page_data['content'],
+            'formatted': formatted is not None
+        }
+
+    max_in_flight = max(1, max_in_flight or llm_max_in_flight)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        window = deque()
+        for page_data in pages:
+            if not page_data['content'].strip():
+                print(f"Skipping empty page {page_data['page_number']}")
+                continue
+            window.append(pool.submit(format_page, page_data))
+            if len(window) >= max_in_flight:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+def format_pages_with_llm(pages_data, max_in_flight=None):
+    """List version of format_pages_stream."""
+    return list(format_pages_stream(pages_data, max_in_flight=max_in_flight))
+
+# Pipeline helper: run a generator stage in its own thread, handing items over a bounded queue.
+_STAGE_ITEM, _STAGE_DONE, _STAGE_ERROR = range(3)
+
+def run_stage(iterable, maxsize=None):
+    """Iterate ``iterable`` in a background thread; the bounded queue gives backpressure."""
+    q = queue.Queue(maxsize=maxsize or pipeline_queue_size)
+    stop = threading.Event()
+
+    def put(kind, payload):
+        while not stop.is_set():
+            try:
+                q.put((kind, payload), timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run():
+        try:
+            for item in iterable:
+                if not put(_STAGE_ITEM, item):
+                    return
+            put(_STAGE_DONE, None)
+        except BaseException as e:
+            put(_STAGE_ERROR, e)
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            kind, payload = q.get()
+            if kind == _STAGE_DONE:
+                return
+            if kind == _STAGE_ERROR:
+                raise payload
+            yield payload
+    finally:
+        stop.set()
+
+def chunk_pages(formatted_pages, book_id, file_path):
+    """Split formatted pages into chunk records with deterministic IDs."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-# Ingest file with LLM formatting
-def ingest_file_with_llm_formatting(file_path):
-    """Enhanced ingestion with LLM formatting for better content quality"""
-    if not file_path.lower().endswith('.pdf'):
-        print(f"Skipping non-PDF file: {file_path}")
-        return
-    
-    print(f"Starting LLM-enhanced ingestion for: {file_path}")
-    
-    pages_data = process_pdf_with_tables(file_path)
-    
-    if not pages_data:
-        print(f"No content extracted from {file_path}")
-        return
-    
-    formatted_pages = []
-    for page_data in pages_data:
-        page_number = page_data['page_number']
-        raw_content = page_data['content']
-        
-        if raw_content.strip():
-            print(f"Formatting page {page_number} with LLM...")
-            formatted_content = format_with_llm(raw_content, page_number)
-            formatted_pages.append({
-                'page_number': page_number,
-                'content': formatted_content,
-                'raw_content': raw_content
-            })
-        else:
-            print(f"Skipping empty page {page_number}")
-    
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size, 
         chunk_overlap=chunk_overlap, 
         separators=["\n\n", "\n", " ", ""]
     )
-    # Split formatted pages into chunks
-    all_chunks = []
     for page_data in formatted_pages:
         page_number = page_data['page_number']
-        formatted_content = page_data['content']
-        
-        chunks = text_splitter.split_text(formatted_content)
-        
+        chunks = text_splitter.split_text(page_data['content'])
         for chunk_order, chunk_text in enumerate(chunks):
-            chunk_data = {
+            yield {
+                'id': chunk_vector_id(book_id, page_number, chunk_order, chunk_text),
                 'content': chunk_text,
                 'page_number': page_number,
                 'chunk_order': chunk_order,
-                'source_file': file_path
+                'source_file': file_path,
+                'llm_formatted': page_data.get('formatted', True)
             }
-            all_chunks.append(chunk_data)
-    
-    print(f"Creating embeddings for {len(all_chunks)} chunks...")
-    
-    uuids = [str(uuid4()) for _ in range(len(all_chunks))]
-    texts = [chunk['content'] for chunk in all_chunks]
-    embeddings_data = model.encode(texts).tolist()
+
+def embed_chunks(chunks, book_id, batch_size=None):
+    """Embed chunks in micro-batches, yielding lists of (id, embedding, metadata) ready to upsert."""
+    batch_size = batch_size or embed_batch_size
+
+    def encode(batch):
+        embeddings = get_model().encode([c['content'] for c in batch]).tolist()
+        return [
+            (c['id'], embedding, {
+                'text': c['content'],
+                'book_id': book_id,
+                'page_number': c['page_number'],
+                'chunk_order': c['chunk_order'],
+                'llm_formatted': c.get('llm_formatted', True)
+            })
+            for c, embedding in zip(batch, embeddings)
+        ]
+
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield encode(batch)
+            batch = []
+    if batch:
+        yield encode(batch)
+
+# Batch upsert function: this is used to split the data into smaller batches for efficient upserting.
+def batch_upsert(index, to_upsert, batch_size=100):
+    """Upserts concurrently in batches sized to stay under Pinecone's 4MB limit, retrying failed batches.
+
+    ``batch_size`` is kept for compatibility; batches are now bounded by bytes. Ingest streams a
+    file's micro-batches through open_upserter instead.
+    """
+    if isinstance(index, LocalVectorStore):
+        # In-process index: nothing to parallelize; ingest saves it once per file (save_local_index).
+        return index.batch_upsert(to_upsert, batch_size=batch_size, save=False)
+    return parallel_upsert(
+        index.upsert,
+        to_upsert,
+        max_workers=settings.upsert_workers,
+        max_batch_bytes=settings.upsert_max_batch_bytes,
+        max_retries=settings.upsert_max_retries,
+    )
+
+def open_upserter(index):
+    """One upserter per file: embedding micro-batches are packed into byte-bounded requests that
+    go out concurrently on a shared pool, and throughput is reported once the file is done."""
+    if isinstance(index, LocalVectorStore):
+        # In-process index: nothing to parallelize or size; ingest saves it once per file (save_local_index).
+        return StreamingUpserter(
+            lambda vectors: index.batch_upsert(vectors, save=False),
+            max_workers=1,
+            max_batch_bytes=None,
+            max_count=embed_batch_size,
+        )
+    return StreamingUpserter(
+        index.upsert,
+        max_workers=settings.upsert_workers,
+        max_batch_bytes=settings.upsert_max_batch_bytes,
+        max_retries=settings.upsert_max_retries,
+        max_in_flight=settings.upsert_max_in_flight,
+    )
+
+def delete_vectors(index, ids):
+    """Deletes by ID in requests under Pinecone's 1000-ID limit, retrying failed requests."""
+    if isinstance(index, LocalVectorStore):
+        return index.delete(ids=ids, save=False)
+    return batch_delete(index.delete, ids, max_retries=settings.upsert_max_retries)
+
+# Pinecone returns at most this many matches per query.
+MAX_QUERY_TOP_K = 10000
+
+def unmanifested_vector_ids(index, book_id, page_numbers, keep):
+    """IDs of a book's vectors other than ``keep``, found by metadata instead of the manifest.
+
+    Books ingested before manifests existed have random uuid4 vector IDs that no manifest
+    records; they are listed this way once, on their first run with a manifest.
+    """
+    book_filter = {'book_id': {'$eq': book_id}}
+    if isinstance(index, LocalVectorStore):
+        found = index.ids(filter=book_filter)
+    else:
+        # Any non-zero vector will do: only the filter matters, and cosine indexes reject zero vectors.
+        probe = [1.0] + [0.0] * (get_model().get_sentence_embedding_dimension() - 1)
+
+        def match_ids(filter_dict):
+            results = index.query(vector=probe, top_k=MAX_QUERY_TOP_K, include_metadata=False, filter=filter_dict)
+            return [match.id for match in results.matches]
+
+        found = match_ids(book_filter)
+        if len(found) >= MAX_QUERY_TOP_K:
+            # Too many for one query: list the book page by page.
+            found = [
+                vector_id for page_number in page_numbers
+                for vector_id in match_ids(dict(book_filter, page_number={'$eq': page_number}))
+            ]
+    return [vector_id for vector_id in dict.fromkeys(found) if vector_id not in keep]
+
+def save_local_index(index):
+    """Persist the local index once per file: rewriting it per micro-batch made ingest O(N^2) in I/O."""
+    if isinstance(index, LocalVectorStore):
+        index.save()
+
+# Incremental re-ingestion: deterministic IDs + a per-document manifest of page hashes.
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def chunk_vector_id(book_id, page_number, chunk_order, chunk_text):
+    """Deterministic vector ID, so re-ingesting unchanged content overwrites instead of duplicating."""
+    key = f"{book_id}\x1f{page_number}\x1f{chunk_order}\x1f{content_hash(chunk_text)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def pipeline_fingerprint():
+    """Anything that changes chunk text or vectors for the same page content invalidates the manifest."""
+    return content_hash(f"{chunk_size}|{chunk_overlap}|{settings.embedding_model_name}|llm_formatted")
+
+def _manifest_path(book_id):
+    return os.path.join(manifest_dir, f"{book_id}.json")
+
+def load_manifest(book_id):
+    try:
+        with open(_manifest_path(book_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(book_id, manifest):
+    os.makedirs(manifest_dir, exist_ok=True)
+    path = _manifest_path(book_id)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+# Ingest file with LLM formatting
+def ingest_file_with_llm_formatting(file_path, workers=None, llm_concurrency=None):
+    """Enhanced ingestion with LLM formatting for better content quality.
+
+    Runs as a streaming pipeline (extract -> format -> chunk -> embed -> upsert), each
+    stage in its own thread behind a bounded queue, so memory stays flat regardless of
+    PDF size and vectors become searchable as soon as their upsert batch lands
+    (with the local backend: once the file is done, when the index is saved).
+
+    Re-runs are incremental: only pages whose extracted text changed since the last
+    run are formatted, embedded and upserted, and vectors of changed or removed pages
+    are deleted.
+
+    Returns True on success (or when there is nothing to do), False on failure.
+    """
+    if not file_path.lower().endswith('.pdf'):
+        print(f"Skipping non-PDF file: {file_path}")
+        return True
+    index = get_index()
+    page_store, keyword_index, table_registry = get_page_store(), get_keyword_index(), get_table_registry()
 
     book_id = os.path.basename(file_path)
-    to_upsert = []
-    
-    for uuid, embedding, chunk_data in zip(uuids, embeddings_data, all_chunks):
-        metadata = {
-            'text': chunk_data['content'],
-            'book_id': book_id,
-            'page_number': chunk_data['page_number'],
-            'chunk_order': chunk_data['chunk_order'],
-            'llm_formatted': True
-        }
-        to_upsert.append((uuid, embedding, metadata))
-    
-    batch_upsert(index, to_upsert, batch_size=50)
-    print(f"Successfully ingested {len(all_chunks)} LLM-formatted chunks from {file_path}")
+    manifest = load_manifest(book_id)
+    fingerprint = pipeline_fingerprint()
+    if manifest.get('fingerprint') != fingerprint:
+        previous_pages = {}
+        stale_ids = [cid for page in manifest.get('pages', {}).values() for cid in page['chunk_ids']]
+    else:
+        previous_pages = manifest.get('pages', {})
+        stale_ids = []
+
+    # Pages that fell back to raw text because LLM formatting failed are formatted again.
+    retry_pages = {pn for pn, page in previous_pages.items() if page.get('formatted') is False}
+
+    current_file_hash = file_hash(file_path)
+    if previous_pages and manifest.get('file_hash') == current_file_hash:
+        if not keyword_index.has_book(book_id) and page_store.has_book(book_id):
+            # Ingested before the keyword index existed: index the stored chunks, no re-embedding needed.
+            keyword_index.put_chunks(page_store.get_book(book_id))
+            print(f"Built keyword index for {book_id}")
+        if page_store.has_book(book_id) and not page_store.has_links(book_id):
+            page_store.link_book(book_id, max_overlap=chunk_overlap)
+            print(f"Built chunk adjacency map for {book_id}")
+        if not manifest.get('tables'):
+            # Ingested before the table registry existed: extraction alone rebuilds it, no LLM calls.
+            for page_data in iter_pdf_pages(file_path, workers=workers or extract_workers):
+                table_registry.put_page_tables(book_id, page_data['page_number'], page_data['tables'])
+            manifest = dict(manifest, tables=True)
+            save_manifest(book_id, manifest)
+            print(f"Built table registry for {book_id}")
+        if not retry_pages:
+            print(f"{file_path} is unchanged since the last ingestion, skipping")
+            return True
+        print(f"{file_path} is unchanged; retrying LLM formatting of {len(retry_pages)} pages")
+
+    print(f"Starting LLM-enhanced ingestion for: {file_path}")
+
+    # Filled in by the extract stage as pages stream past.
+    page_hashes = {}
+    changed_pages = []
+    unformatted_pages = set()
+    # Tables of unchanged pages are already registered, unless the manifest predates the registry.
+    register_all_tables = not manifest.get('tables')
+
+    def changed_only(pages):
+        for page_data in pages:
+            pn = str(page_data['page_number'])
+            page_hashes[pn] = content_hash(page_data['content'])
+            changed = previous_pages.get(pn, {}).get('hash') != page_hashes[pn] or pn in retry_pages
+            if changed or register_all_tables:
+                table_registry.put_page_tables(book_id, page_data['page_number'], page_data['tables'])
+            if changed:
+                changed_pages.append(page_data['page_number'])
+                yield page_data
+
+    def track_formatting(pages):
+        for page_data in pages:
+            if not page_data.get('formatted', True):
+                unformatted_pages.add(page_data['page_number'])
+            yield page_data
+
+    if not previous_pages:
+        # Before the stages start: the extract stage registers tables as soon as it runs.
+        table_registry.delete_book(book_id)
+    pages = run_stage(changed_only(iter_pdf_pages(file_path, workers=workers or extract_workers)))
+    formatted = run_stage(format_pages_stream(pages, max_in_flight=llm_concurrency))
+    batches = run_stage(embed_chunks(chunk_pages(track_formatting(formatted), book_id, file_path), book_id))
+
+    if not previous_pages:
+        page_store.delete_book(book_id)
+        keyword_index.delete_book(book_id)
+    cleared_pages = set()
+    new_ids = []
+    try:
+        with open_upserter(index) as upserter:
+            for to_upsert in batches:
+                upserter.add(to_upsert)
+
+                # Page-keyed sidecar so /page never needs a filtered vector query, plus the BM25 index.
+                for page_number in {metadata['page_number'] for _, _, metadata in to_upsert} - cleared_pages:
+                    page_store.delete_page(book_id, page_number)
+                    keyword_index.delete_page(book_id, page_number)
+                    cleared_pages.add(page_number)
+                rows = [
+                    (book_id, metadata['page_number'], metadata['chunk_order'], vector_id, metadata['text'])
+                    for vector_id, _, metadata in to_upsert
+                ]
+                page_store.put_chunks(rows)
+                keyword_index.put_chunks(rows)
+                new_ids.extend((vector_id, metadata['page_number']) for vector_id, _, metadata in to_upsert)
+            # Vectors are sent as their batches fill; close() sends the rest and waits for all of them.
+            upserter.close()
+        bump_index_version(settings.index_version_file)
+    except Exception as e:
+        print(f"Error ingesting {file_path}: {e}")
+        return False
+
+    if not page_hashes:
+        print(f"No content extracted from {file_path}")
+        return False
+
+    removed_pages = [int(pn) for pn in previous_pages if pn not in page_hashes]
+    for pn in [str(p) for p in changed_pages] + [str(p) for p in removed_pages]:
+        stale_ids.extend(previous_pages.get(pn, {}).get('chunk_ids', []))
+    # Changed pages that no longer produce any chunk still need their old sidecar rows removed.
+    for page_number in set(changed_pages + removed_pages) - cleared_pages:
+        page_store.delete_page(book_id, page_number)
+        keyword_index.delete_page(book_id, page_number)
+    for page_number in removed_pages:
+        table_registry.delete_page(book_id, page_number)
+    print(f"{len(changed_pages)}/{len(page_hashes)} pages changed, {len(removed_pages)} removed")
+    if unformatted_pages:
+        print(f"{len(unformatted_pages)} pages kept their raw text after LLM formatting failed; they are retried next run")
+    # Neighbours can change across page breaks too, so the whole book's adjacency map is rebuilt.
+    page_store.link_book(book_id, max_overlap=chunk_overlap)
+
+    # Delete after upserting so changed pages stay searchable throughout the run.
+    upserted = {vector_id for vector_id, _ in new_ids}
+    if not manifest:
+        # First run with a manifest: vectors left by older ingests (or a run that failed before
+        # saving one) are recorded nowhere, so they are found by book_id and deleted now.
+        try:
+            stale_ids.extend(unmanifested_vector_ids(index, book_id, sorted(int(pn) for pn in page_hashes), upserted))
+        except Exception as e:
+            print(f"Error listing existing vectors of {file_path}: {e}")
+            return False
+    stale_ids = [vid for vid in dict.fromkeys(stale_ids) if vid not in upserted]
+    if stale_ids:
+        try:
+            delete_vectors(index, stale_ids)
+        except Exception as e:
+            # Like a failed upsert: the manifest isn't saved, so the next run retries the deletes.
+            print(f"Error deleting stale vectors of {file_path}: {e}")
+            return False
+        print(f"Deleted {len(stale_ids)} stale vectors")
+
+    pages_manifest = {pn: page for pn, page in previous_pages.items() if pn in page_hashes}
+    for page_number in changed_pages:
+        pages_manifest[str(page_number)] = {'hash': page_hashes[str(page_number)], 'chunk_ids': []}
+        if page_number in unformatted_pages:
+            pages_manifest[str(page_number)]['formatted'] = False
+    for vector_id, page_number in new_ids:
+        pages_manifest[str(page_number)]['chunk_ids'].append(vector_id)
+    # The vectors must be on disk before the manifest records their pages as done.
+    save_local_index(index)
+    save_manifest(book_id, {
+        'book_id': book_id,
+        'file_hash': current_file_hash,
+        'fingerprint': fingerprint,
+        'pages': pages_manifest,
+        'tables': True,
+    })
+
+    bump_index_version(settings.index_version_file)
+    print(f"Successfully ingested {len(new_ids)} LLM-formatted chunks from {file_path}")
+    return True
 
 # Query a specific page
 def query_page(book_id, page_number):
     """Query all text chunks from a specific book and page number."""
-    dummy_vector = [0.0] * model.get_sentence_embedding_dimension()
+    page_store = get_page_store()
+    if page_store.has_book(book_id):
+        return page_store.get_page(book_id, page_number)
+    index = get_index()
+    if isinstance(index, LocalVectorStore):
+        return index.query_page(book_id, page_number)
+    dummy_vector = [0.0] * get_model().get_sentence_embedding_dimension()
     filter_dict = {
         'book_id': {'$eq': book_id},
         'page_number': {'$eq': page_number}
@@ -239,32 +608,137 @@ def query_page(book_id, page_number):
         print(f"Error querying Pinecone: {e}")
         return []
 
+# Ingest daemon: watch the data folder and feed a persistent job queue drained by parallel file workers.
+def _is_ingestable(path):
+    name = os.path.basename(path)
+    # "_name.pdf" is how the old polling loop marked files it had ingested (as book "name.pdf",
+    # with random vector IDs and no manifest); ingesting them again would duplicate those vectors.
+    return name.lower().endswith('.pdf') and not name.startswith(('.', '_'))
+
+def _scan_data_folder():
+    """Current (mtime, size) signature of every ingestable file in the data folder."""
+    signatures = {}
+    for filename in os.listdir(data_folder):
+        path = os.path.join(data_folder, filename)
+        if not _is_ingestable(path):
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        signatures[path] = (st.st_mtime_ns, st.st_size)
+    return signatures
+
+def watch_with_inotify(jobs, stop):
+    """Enqueue files as soon as they are fully written or moved into the data folder."""
+    from inotify_simple import INotify, flags
+
+    inotify = INotify()
+    inotify.add_watch(data_folder, flags.CLOSE_WRITE | flags.MOVED_TO)
+    print(f"Watching {data_folder} with inotify")
+    while not stop.is_set():
+        for event in inotify.read(timeout=1000):
+            path = os.path.join(data_folder, event.name)
+            if _is_ingestable(path) and jobs.enqueue(path):
+                print(f"Queued {path}")
+
+def watch_with_polling(jobs, stop, seen):
+    """Fallback watcher: a file is queued once its signature is stable across two scans."""
+    print(f"Watching {data_folder} by polling every {check_interval}s")
+    previous = {}
+    while not stop.wait(check_interval):
+        current = _scan_data_folder()
+        for path, signature in current.items():
+            if seen.get(path) != signature and previous.get(path) == signature:
+                seen[path] = signature
+                if jobs.enqueue(path):
+                    print(f"Queued {path}")
+        previous = current
+
+def _file_worker(jobs, stop, workers, llm_concurrency):
+    while not stop.is_set():
+        job = jobs.claim()
+        if job is None:
+            stop.wait(1.0)
+            continue
+        print(f"[job {job['id']}] ingesting {job['path']} (attempt {job['attempts']})")
+        error = None
+        try:
+            if not os.path.exists(job['path']):
+                error = "file no longer exists"
+            elif not ingest_file_with_llm_formatting(job['path'], workers=workers, llm_concurrency=llm_concurrency):
+                error = "ingestion failed"
+        except Exception as e:
+            error = str(e)
+        if error is None:
+            jobs.complete(job['id'])
+            print(f"[job {job['id']}] done")
+        else:
+            state = jobs.fail(job['id'], error)
+            print(f"[job {job['id']}] {error}; job is now {state}")
+
+def run_daemon(file_workers=None, workers=None, llm_concurrency=None):
+    """Ingest every PDF in the data folder, then keep ingesting new or changed ones.
+
+    Jobs live in a SQLite queue (settings.ingest_jobs_path), so a crash mid-file simply
+    re-queues the job on restart; incremental ingestion makes the retry cheap.
+    """
+    jobs = JobQueue(settings.ingest_jobs_path, max_attempts=ingest_max_attempts)
+    recovered = jobs.recover()
+    if recovered:
+        print(f"Re-queued {recovered} jobs interrupted by a previous run")
+
+    seen = _scan_data_folder()
+    for path in seen:
+        jobs.enqueue(path)
+
+    stop = threading.Event()
+    threads = [
+        threading.Thread(
+            target=_file_worker,
+            args=(jobs, stop, workers, llm_concurrency),
+            name=f"ingest-worker-{i}",
+            daemon=True,
+        )
+        for i in range(max(1, file_workers or ingest_file_workers))
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        try:
+            watch_with_inotify(jobs, stop)
+        except (ImportError, OSError) as e:
+            print(f"inotify unavailable ({e}), falling back to polling")
+            watch_with_polling(jobs, stop, seen)
+    except KeyboardInterrupt:
+        print("Stopping ingest daemon...")
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
 def main_loop():
-    """Process any unprocessed files in the data folder"""
-    while True:
-        processed_any = False
-        for filename in os.listdir(data_folder):
-            if not filename.startswith("_"):
-                file_path = os.path.join(data_folder, filename)
-                ingest_file_with_llm_formatting(file_path)
-                
-                # Mark as processed
-                new_filename = "_" + filename
-                new_file_path = os.path.join(data_folder, new_filename)
-                os.rename(file_path, new_file_path)
-                processed_any = True
-        
-        if not processed_any:
-            print("No new files to process. Waiting...")
-        
-        time.sleep(check_interval)
+    """Process any unprocessed files in the data folder (kept for compatibility, see run_daemon)."""
+    run_daemon()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest PDFs into the vector index")
+    parser.add_argument("--workers", type=int, default=extract_workers, help="Processes used for page extraction")
+    parser.add_argument("--llm-concurrency", type=int, default=llm_max_in_flight, help="Concurrent LLM formatting requests")
+    parser.add_argument("--daemon", action="store_true", help="Watch the data folder and ingest new or changed PDFs")
+    parser.add_argument("--file-workers", type=int, default=ingest_file_workers, help="Files ingested in parallel in daemon mode")
+    args = parser.parse_args()
+
+    if args.daemon:
+        run_daemon(file_workers=args.file_workers, workers=args.workers, llm_concurrency=args.llm_concurrency)
+        raise SystemExit(0)
+
     test_file = "./data/_file-1.pdf"
     
     if os.path.exists(test_file):
         print("Testing LLM-enhanced ingestion...")
-        ingest_file_with_llm_formatting(test_file)
+        ingest_file_with_llm_formatting(test_file, workers=args.workers, llm_concurrency=args.llm_concurrency)
     else:
         print("Available files in ./data/:")
         if os.path.exists("./data/"):
@@ -0,0 +1,51 @@
+"""
+Migration tool: bulk-import the file-based sessions/*.json into the SQLite memory store.
+"""
+
+import argparse
+import glob
+import json
+import os
+from chatbot.config import Settings
+from chatbot.memory import SqliteMemoryStore
+
+def load_session_files(sessions_dir):
+    """Read every sessions/*.json file into (session_id, history, summary, last_activity) records."""
+    records = []
+    skipped = 0
+    for path in sorted(glob.glob(os.path.join(sessions_dir, "*.json"))):
+        session_id = os.path.splitext(os.path.basename(path))[0]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Skipping unreadable session file {path}: {e}")
+            skipped += 1
+            continue
+        records.append((
+            session_id,
+            data.get("history", []),
+            data.get("summary", ""),
+            os.path.getmtime(path)
+        ))
+    return records, skipped
+
+def main():
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Import sessions/*.json into the SQLite memory store")
+    parser.add_argument("--sessions-dir", default="sessions", help="Directory with <session_id>.json files")
+    parser.add_argument("--db", default=settings.sessions_db_path, help="SQLite database to import into")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Sessions per transaction")
+    args = parser.parse_args()
+
+    records, skipped = load_session_files(args.sessions_dir)
+    store = SqliteMemoryStore(db_path=args.db)
+    imported = 0
+    for i in range(0, len(records), args.batch_size):
+        imported += store.import_sessions(records[i : i + args.batch_size])
+        print(f"Imported {imported}/{len(records)} sessions")
+    store.close()
+    print(f"Done: {imported} sessions imported into {args.db}, {skipped} skipped")
+
+if __name__ == "__main__":
+    main()